@@ -0,0 +1,105 @@
+# abap_patterns.py  (block patterns used by app.py, compiled once at import)
+import re
+
+# ---------- Name fragments ----------
+# ABAP FORM names with hyphens: e.g., PROCESS-DATA-MATERIAL
+FORM_NAME = r"[A-Za-z_][A-Za-z0-9_-]*"
+# METHOD names: 'constructor', 'class_constructor', and 'iface~method'
+METHOD_NAME = r"(?:[A-Za-z_]\w*(?:~\w+)?|CONSTRUCTOR|CLASS_CONSTRUCTOR)"
+
+# ---------- Line-head patterns ----------
+# Block detection is a line scanner (app._scan_blocks): every pattern below is
+# matched against a single source line via pattern.match(src, pos, endpos).
+# Notes:
+# - FORM allows a multi-line parameter header; only the FORM line itself is matched.
+# - CLASS ... DEFINITION matches modifiers on the header.
+# - MODULE captures optional INPUT/OUTPUT mode.
+# - MACRO: DEFINE ... END-OF-DEFINITION.
+# - METHOD: supports constructor/class_constructor and iface~method; also matched top-level.
+
+# Case-insensitive everywhere: the source is uppercased once per request (see
+# fold_case) and the patterns, all written in uppercase, run on that copy
+# without re.IGNORECASE. Names and code are sliced from the original source.
+
+# Closers: keyword + dot, optionally followed by a "-comment. Top-level closers
+# must end the line; ENDMETHOD inside a class implementation may be followed by code.
+def _end_re(keyword: str, eol: bool = True):
+    return re.compile(rf"[ \t]*{keyword}\s*\.(?:[ \t]*\"[^\n]*)?" + (r"\s*$" if eol else ""))
+
+ENDFORM_RE      = _end_re("ENDFORM")
+ENDCLASS_RE     = _end_re("ENDCLASS")
+ENDFUNCTION_RE  = _end_re("ENDFUNCTION")
+ENDMODULE_RE    = _end_re("ENDMODULE")
+ENDMACRO_RE     = _end_re("END-OF-DEFINITION")
+ENDMETHOD_RE    = _end_re("ENDMETHOD")
+ENDMETHOD_IN_CLASS_RE = _end_re("ENDMETHOD", eol=False)
+
+# Openers: one alternative per block kind, each wrapping "<kind>_name" (+ "module_mode").
+# They are combined into a single multi-pattern regex per scan context, so a line costs
+# one match call and head.lastgroup says which kind it opened.
+OPENER_PATTERNS = {
+    "form":   rf"FORM\s+(?P<form_name>{FORM_NAME})(?=[\s\.]|$)",
+    "cldef":  r"CLASS\s+(?P<cldef_name>\w+)\s+DEFINITION\b[^\n]*\.",
+    "climp":  r"CLASS\s+(?P<climp_name>\w+)\s+IMPLEMENTATION\s*\.",
+    "func":   r"FUNCTION\s+(?P<func_name>\w+)\s*\.",
+    "module": r"MODULE\s+(?P<module_name>\w+)(?:\s+(?P<module_mode>INPUT|OUTPUT))?\s*\.",
+    "macro":  r"DEFINE\s+(?P<macro_name>\w+)\s*\.",
+    "method": rf"METHOD\s+(?P<method_name>{METHOD_NAME})\s*\.",
+}
+
+def _opener_re(*kinds: str):
+    alts = "|".join(rf"(?P<{k}>{OPENER_PATTERNS[k]})" for k in kinds)
+    return re.compile(rf"[ \t]*(?:{alts})")
+
+# IMPORTANT: the class implementation swallows its whole body, so methods inside
+# are never seen at top level; they are scanned separately with CLASS_METHOD_OPENER_RE.
+TOPLEVEL_OPENER_RE = _opener_re("form", "cldef", "climp", "func", "module", "macro", "method")
+TOPLEVEL_CLOSERS = {
+    "form":   ENDFORM_RE,
+    "cldef":  ENDCLASS_RE,
+    "climp":  ENDCLASS_RE,
+    "func":   ENDFUNCTION_RE,
+    "module": ENDMODULE_RE,
+    "macro":  ENDMACRO_RE,
+    "method": ENDMETHOD_RE,
+}
+CLASS_METHOD_OPENER_RE = _opener_re("method")
+CLASS_METHOD_CLOSERS = {"method": ENDMETHOD_IN_CLASS_RE}
+
+# Candidate lines: every opener and closer above starts with one of these keywords
+# (after blanks), so one finditer over the whole source finds all lines the scanner
+# has to look at. The initial-letter lookahead rejects most statement lines before
+# the alternation runs.
+HEAD_KEYWORDS = (
+    "FORM", "CLASS", "FUNCTION", "MODULE", "DEFINE", "METHOD",
+    "ENDFORM", "ENDCLASS", "ENDFUNCTION", "ENDMODULE", "END-OF-DEFINITION", "ENDMETHOD",
+)
+
+_HEAD_INITIALS = "".join(sorted({k[0] for k in HEAD_KEYWORDS}))
+HEAD_LINE_RE = re.compile(rf"\n[ \t]*(?=[{_HEAD_INITIALS}])(?:" + "|".join(map(re.escape, HEAD_KEYWORDS)) + ")")
+
+_ASCII_UPPER = str.maketrans("abcdefghijklmnopqrstuvwxyz", "ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+def fold_case(src: str) -> str:
+    """Uppercased copy of src with the same length, so match offsets index src directly."""
+    if src.isascii():
+        return src.upper()
+    # One byte per character (PEP 393 UCS1): bytes.upper() folds ASCII letters only,
+    # in C, and never changes the length
+    try:
+        return src.encode("latin-1").upper().decode("latin-1")
+    except UnicodeEncodeError:
+        pass
+    up = src.upper()
+    if len(up) == len(src):
+        return up
+    # A few letters expand when uppercased; "ß" -> "SS" is the common one (German comments)
+    up = src.replace("ß", "ẞ").upper()
+    if len(up) == len(src):
+        return up
+    # Slow but exact: fold ASCII letters only, which is all the keywords need
+    return src.translate(_ASCII_UPPER)
+
+NEWLINE_RE = re.compile("\n")
+# A gap between blocks is raw_code only if this finds a non-blank character in it
+NONWS_RE = re.compile(r"\S")
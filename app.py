@@ -1,218 +1,193 @@
-# abap_parser_app.py  (v1.12 – FORM names accept hyphens; allow dot/space after name)
+# abap_parser_app.py  (v1.13 – line scanner: blocks run from their opener line to their closer line)
 from fastapi import FastAPI
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 import re
-from typing import List, Dict, Any
-
-app = FastAPI(title="ABAP Parser API", version="1.12")
+import orjson
+import hashlib
+import os
+import multiprocessing
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from abap_patterns import (
+    TOPLEVEL_OPENER_RE, TOPLEVEL_CLOSERS,
+    CLASS_METHOD_OPENER_RE, CLASS_METHOD_CLOSERS,
+    HEAD_LINE_RE, NEWLINE_RE, NONWS_RE, fold_case,
+)
 
 class ABAPInput(BaseModel):
     pgm_name: str
     inc_name: str
     code: str
+    # False: return only type/name/line ranges, without the "code" of each record
+    include_code: bool = True
 
-# ---------- Name fragments ----------
-# ABAP FORM names with hyphens: e.g., PROCESS-DATA-MATERIAL
-FORM_NAME = r"(?P<name>[A-Za-z_][A-Za-z0-9_-]*)"
+class ABAPBatch(BaseModel):
+    items: List[ABAPInput]
 
-# ---------- Robust, line-aware block patterns ----------
-# Notes:
-# - FORM now allows multi-line parameter header until the first dot.
-# - CLASS ... DEFINITION matches modifiers on the header.
-# - MODULE captures optional INPUT/OUTPUT mode.
-# - MACRO: DEFINE ... END-OF-DEFINITION.
-# - METHOD: supports constructor/class_constructor and iface~method; also matched top-level.
+def _newline_offsets(src: str) -> List[int]:
+    """Sorted offsets of every '\n' in src, prefixed with a -1 sentinel (built once per request)."""
+    # finditer + Match.start keeps the scan in C; a per-character Python loop is ~4x slower.
+    # Offsets are code-point indices (what re reports on str); a byte-level index
+    # (bytes/NumPy) would need a byte->code-point map for any non-ASCII source.
+    nl_offsets = [-1]
+    nl_offsets.extend(map(re.Match.start, NEWLINE_RE.finditer(src)))
+    return nl_offsets
 
-# Case-insensitive, multiline, dotall everywhere
-
-# FORM: allow hyphens in name and allow *either space or dot* after the name
-FORM_BLOCK_RE = re.compile(
-    rf"(?ims)^\s*FORM\s+{FORM_NAME}(?=[\s\.])(?P<header>[\s\S]*?)\.\s*.*?^\s*ENDFORM\s*\.(?:[ \t]*\"[^\n]*)?\s*$"
-)
+def _head_lines(src: str, nl_offsets: List[int]) -> List[int]:
+    """Ascending 0-based indices of lines that may open or close a block (built once per request)."""
+    # Line 0 has no leading '\n'; it is always a candidate, the opener/closer match decides
+    heads = [0]
+    # map() keeps the per-match bisect in C (no generator frame per candidate line)
+    heads.extend(map(bisect_left, repeat(nl_offsets), map(re.Match.start, HEAD_LINE_RE.finditer(src))))
+    return heads
 
-CLDEF_BLOCK_RE  = re.compile(
-    r"(?ims)^\s*CLASS\s+(\w+)\s+DEFINITION\b[^\n]*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$"
-)
-CLIMP_BLOCK_RE  = re.compile(
-    r"(?ims)^\s*CLASS\s+(\w+)\s+IMPLEMENTATION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$"
-)
-# Name supports 'constructor', 'class_constructor', and 'iface~method'
-METHOD_BLOCK_RE = re.compile(
-    r"(?ims)^\s*METHOD\s+([A-Za-z_]\w*(?:~\w+)?|constructor|class_constructor)\s*\.\s*.*?^\s*ENDMETHOD\s*\.(?:[ \t]*\"[^\n]*)?"
-)
-FUNC_BLOCK_RE   = re.compile(
-    r"(?ims)^\s*FUNCTION\s+(\w+)\s*\.\s*.*?^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$"
-)
-MODULE_BLOCK_RE = re.compile(
-    r"(?ims)^\s*MODULE\s+(\w+)(?:\s+(INPUT|OUTPUT))?\s*\.\s*.*?^\s*ENDMODULE\s*\.(?:[ \t]*\"[^\n]*)?\s*$"
-)
-MACRO_BLOCK_RE  = re.compile(
-    r"(?ims)^\s*DEFINE\s+(\w+)\s*\.\s*.*?^\s*END-OF-DEFINITION\s*\.(?:[ \t]*\"[^\n]*)?\s*$"
-)
-
-# Combined regex for all top-level blocks.
-# IMPORTANT: the class implementation alt will swallow the whole class block, so
-# methods inside won’t be double-matched by the METHOD alt below.
-TOPLEVEL_RE = re.compile(
-    rf"(?ims)"
-    rf"(^\s*FORM\s+{FORM_NAME}(?=[\s\.])[\s\S]*?\.\s*.*?^\s*ENDFORM\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*CLASS\s+\w+\s+DEFINITION\b[^\n]*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*CLASS\s+\w+\s+IMPLEMENTATION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*FUNCTION\s+\w+\s*\.\s*.*?^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*MODULE\s+\w+(?:\s+(?:INPUT|OUTPUT))?\s*\.\s*.*?^\s*ENDMODULE\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*DEFINE\s+\w+\s*\.\s*.*?^\s*END-OF-DEFINITION\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*METHOD\s+(?:[A-Za-z_]\w*(?:~\w+)?|constructor|class_constructor)\s*\.\s*.*?^\s*ENDMETHOD\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-)
-
-def _offsets_to_lines(src: str, start: int, end: int):
-    """Convert absolute character offsets into 1-based line numbers (inclusive)."""
-    start_line = src.count("\n", 0, start) + 1 if src else 0
-    end_line   = src.count("\n", 0, end) + 1 if src else 0
+def _offsets_to_lines(nl_offsets: List[int], start: int, end: int):
+    """Convert an absolute character span [start, end) into 1-based line numbers (inclusive)."""
+    start_line = bisect_left(nl_offsets, start)
+    end_line   = bisect_left(nl_offsets, max(end - 1, start))
     return start_line, end_line
 
-def _emit_block(input_json: Dict[str, Any], block_text: str, start_off: int, end_off: int, results: List[Dict[str, Any]]):
+def _scan_blocks(src: str, nl_offsets: List[int], heads: List[int], opener_re, closers, first_line: int = 0, last_line: Optional[int] = None):
     """
-    Emits one or more result records for a matched block.
-    For class_impl: emit container-only code first, then full method items.
-    For others: emit single record as-is.
+    Single pass over the candidate lines (see _head_lines) within [first_line, last_line).
+    Yields (kind, head_match, start_off, end_off) for each opener line paired with
+    the first closer line of its kind after it; lines in between are not inspected
+    for other openers. An opener without a closer is skipped and scanning resumes
+    on the line after it. src is the uppercased copy (fold_case); offsets are
+    the same as in the original source.
+    Linear time on any input: every pattern is matched within one line, and each
+    closer kind is rescanned for at most once (exhausted), so malformed code
+    (e.g. FORMs without ENDFORM) cannot cause the backtracking blow-up of the
+    old whole-source ".*?" block regexes.
     """
-    src_all = input_json["code"]
-    start_line, end_line = _offsets_to_lines(src_all, start_off, end_off)
-
-    # FORM
-    m = FORM_BLOCK_RE.match(block_text)
-    if m:
-        name = m.group("name")
-        results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
-            "type": "perform",
-            "name": name,
-            "start_line": start_line,
-            "end_line": end_line,
-            "code": block_text
-        })
-        return
-
-    # CLASS DEFINITION
-    m = CLDEF_BLOCK_RE.match(block_text)
-    if m:
-        name = m.group(1)
-        results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
-            "type": "class_definition",
-            "name": name,
-            "start_line": start_line,
-            "end_line": end_line,
-            "code": block_text
-        })
-        return
+    n_lines = len(nl_offsets)
+    if last_line is None:
+        last_line = n_lines
+    src_len = len(src)
+    exhausted = set()   # closers known to be absent from the rest of the range
 
-    # CLASS IMPLEMENTATION (container + inner methods)
-    m = CLIMP_BLOCK_RE.match(block_text)
-    if m:
-        class_name = m.group(1)
-        method_spans = [(mm.start(0), mm.end(0)) for mm in METHOD_BLOCK_RE.finditer(block_text)]
-        if method_spans:
-            first_start = method_spans[0][0]
-            last_end    = method_spans[-1][1]
-            header = block_text[:first_start].rstrip()
-            footer = block_text[last_end:].lstrip()
-            container_code = header + ("\n" if header and footer else "") + footer
+    state = None        # kind of the open block
+    j = bisect_left(heads, first_line)
+    j_end = bisect_left(heads, last_line)
+    while j < j_end:
+        i = heads[j]
+        pos = nl_offsets[i] + 1
+        endpos = nl_offsets[i + 1] if i + 1 < n_lines else src_len
+        if state is None:
+            hm = opener_re.match(src, pos, endpos)
+            if hm:
+                kind = hm.lastgroup
+                if closers[kind] not in exhausted:
+                    state, head, closer, open_j = kind, hm, closers[kind], j
         else:
-            container_code = block_text
-
-        results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
-            "type": "class_impl",
-            "name": class_name,
-            "start_line": start_line,
-            "end_line": end_line,
-            "code": container_code
-        })
-
-        for mm in METHOD_BLOCK_RE.finditer(block_text):
-            m_name = mm.group(1)
-            m_abs_start = start_off + mm.start(0)
-            m_abs_end   = start_off + mm.end(0)
-            m_sl, m_el  = _offsets_to_lines(src_all, m_abs_start, m_abs_end)
-            results.append({
-                "pgm_name": input_json["pgm_name"],
-                "inc_name": input_json["inc_name"],
-                "type": "method",
-                "class_implementation": class_name,
-                "name": m_name,
-                "start_line": m_sl,
-                "end_line": m_el,
-                "code": mm.group(0)
-            })
-        return
+            em = closer.match(src, pos, endpos)
+            if em:
+                yield state, head, head.start(), em.end()
+                state = None
+        j += 1
+        if state is not None and j == j_end:
+            # Unterminated: treat the opener as plain code and rescan after it
+            exhausted.add(closer)
+            state = None
+            j = open_j + 1
 
-    # FUNCTION
-    m = FUNC_BLOCK_RE.match(block_text)
-    if m:
-        name = m.group(1)
-        results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
-            "type": "function",
-            "name": name,
-            "start_line": start_line,
-            "end_line": end_line,
-            "code": block_text
-        })
-        return
+# Record "type" per block kind
+BLOCK_TYPES = {
+    "form":   "perform",
+    "cldef":  "class_definition",
+    "climp":  "class_impl",
+    "func":   "function",
+    "module": "module",
+    "macro":  "macro",
+    "method": "method",
+}
+
+def _emit_class_impl(pgm_name: str, inc_name: str, src: str, src_up: str, nl_offsets: List[int], heads: List[int], kind: str, head: "re.Match", start_off: int, end_off: int, include_code: bool = True) -> Iterator[Dict[str, Any]]:
+    """CLASS IMPLEMENTATION: container-only code first, then full method items."""
+    class_name = src[head.start("climp_name"):head.end("climp_name")]
+    start_line, end_line = _offsets_to_lines(nl_offsets, start_off, end_off)
+    # Body lines only: between the CLASS line and the ENDCLASS line
+    methods = list(_scan_blocks(src_up, nl_offsets, heads, CLASS_METHOD_OPENER_RE, CLASS_METHOD_CLOSERS, start_line, end_line - 1))
 
-    # MODULE
-    m = MODULE_BLOCK_RE.match(block_text)
-    if m:
-        name = m.group(1)
-        mode = (m.group(2) or "").upper()
+    rec = {
+        "pgm_name": pgm_name,
+        "inc_name": inc_name,
+        "type": "class_impl",
+        "name": class_name,
+        "start_line": start_line,
+        "end_line": end_line,
+    }
+    if include_code:
+        if methods:
+            first_start = methods[0][2]
+            last_end    = methods[-1][3]
+            header = src[start_off:first_start].rstrip()
+            footer = src[last_end:end_off].lstrip()
+            rec["code"] = header + ("\n" if header and footer else "") + footer
+        else:
+            rec["code"] = src[start_off:end_off]
+    yield rec
+
+    for _, m_head, m_abs_start, m_abs_end in methods:
+        m_sl, m_el  = _offsets_to_lines(nl_offsets, m_abs_start, m_abs_end)
         rec = {
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
-            "type": "module",
-            "name": name,
-            "start_line": start_line,
-            "end_line": end_line,
-            "code": block_text
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
+            "type": "method",
+            "class_implementation": class_name,
+            "name": src[m_head.start("method_name"):m_head.end("method_name")],
+            "start_line": m_sl,
+            "end_line": m_el,
         }
-        if mode:
-            rec["mode"] = mode
-        results.append(rec)
-        return
+        if include_code:
+            rec["code"] = src[m_abs_start:m_abs_end]
+        yield rec
 
-    # MACRO
-    m = MACRO_BLOCK_RE.match(block_text)
-    if m:
-        name = m.group(1)
-        results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
-            "type": "macro",
-            "name": name,
-            "start_line": start_line,
-            "end_line": end_line,
-            "code": block_text
-        })
-        return
+def _emit_single(pgm_name: str, inc_name: str, src: str, src_up: str, nl_offsets: List[int], heads: List[int], kind: str, head: "re.Match", start_off: int, end_off: int, include_code: bool = True) -> Tuple[Dict[str, Any]]:
+    """
+    FORM, CLASS DEFINITION, FUNCTION, MACRO and stand-alone METHOD (when not wrapped
+    by a class implementation in this include): one record each.
+    """
+    start_line, end_line = _offsets_to_lines(nl_offsets, start_off, end_off)
+    rec = {
+        "pgm_name": pgm_name,
+        "inc_name": inc_name,
+        "type": BLOCK_TYPES[kind],
+        "name": src[head.start(kind + "_name"):head.end(kind + "_name")],
+        "start_line": start_line,
+        "end_line": end_line,
+    }
+    if include_code:
+        rec["code"] = src[start_off:end_off]
+    return (rec,)
 
-    # Stand-alone METHOD (when not wrapped by a class implementation in this include)
-    m = METHOD_BLOCK_RE.match(block_text)
-    if m:
-        m_name = m.group(1)
-        results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
-            "type": "method",
-            "name": m_name,
-            "start_line": start_line,
-            "end_line": end_line,
-            "code": block_text
-        })
-        return
+def _emit_module(pgm_name: str, inc_name: str, src: str, src_up: str, nl_offsets: List[int], heads: List[int], kind: str, head: "re.Match", start_off: int, end_off: int, include_code: bool = True) -> Tuple[Dict[str, Any]]:
+    """MODULE: like _emit_single, plus "mode" (INPUT/OUTPUT) when given."""
+    recs = _emit_single(pgm_name, inc_name, src, src_up, nl_offsets, heads, kind, head, start_off, end_off, include_code)
+    mode = head.group("module_mode")
+    if mode:
+        recs[0]["mode"] = mode
+    return recs
+
+# Record emitter per block kind (head.lastgroup from _scan_blocks); each returns an
+# iterable of records. Without include_code, records carry no "code" and no
+# substrings are sliced out.
+BLOCK_HANDLERS = {
+    "form":   _emit_single,
+    "cldef":  _emit_single,
+    "climp":  _emit_class_impl,
+    "func":   _emit_single,
+    "module": _emit_module,
+    "macro":  _emit_single,
+    "method": _emit_single,
+}
 
 def _normalize_code(s: str) -> str:
     """Normalize exotic whitespace: CRLF -> LF, NBSP -> space, LS/PS -> LF."""
@@ -223,60 +198,296 @@ def _normalize_code(s: str) -> str:
     s = s.replace("\u2028", "\n").replace("\u2029", "\n")
     return s
 
-def parse_abap_code_to_ndjson(input_json: dict):
+def parse_abap_code_to_ndjson(input_json: dict) -> Iterator[Dict[str, Any]]:
+    """Yields result records in source order (one NDJSON line each)."""
     src = _normalize_code(input_json.get("code", "") or "")
-    results: List[Dict[str, Any]] = []
+    pgm_name = input_json.get("pgm_name", "")
+    inc_name = input_json.get("inc_name", "")
+    nl_offsets = _newline_offsets(src)
+    src_up = fold_case(src)
+    heads = _head_lines(src_up, nl_offsets)
+    include_code = input_json.get("include_code", True)
+    emitted = False
 
     last_end = 0
-    for m in TOPLEVEL_RE.finditer(src):
-        s, e = m.start(0), m.end(0)
+    for kind, head, s, e in _scan_blocks(src_up, nl_offsets, heads, TOPLEVEL_OPENER_RE, TOPLEVEL_CLOSERS):
 
         # Raw code segment before this block
-        gap = src[last_end:s]
-        if gap.strip():
-            g_sl, g_el = _offsets_to_lines(src, last_end, s - 1 if s > 0 else 0)
-            results.append({
-                "pgm_name": input_json.get("pgm_name", ""),
-                "inc_name": input_json.get("inc_name", ""),
+        if NONWS_RE.search(src, last_end, s):
+            g_sl, g_el = _offsets_to_lines(nl_offsets, last_end, s)
+            rec = {
+                "pgm_name": pgm_name,
+                "inc_name": inc_name,
                 "type": "raw_code",
-                "name": input_json.get("inc_name", ""),
+                "name": inc_name,
                 "start_line": g_sl,
                 "end_line": g_el,
-                "code": gap
-            })
+            }
+            if include_code:
+                rec["code"] = src[last_end:s]
+            yield rec
 
-        block_text = m.group(0)
-        _emit_block(input_json | {"code": src}, block_text, s, e, results)
-        last_end = e
+        yield from BLOCK_HANDLERS[kind](pgm_name, inc_name, src, src_up, nl_offsets, heads, kind, head, s, e, include_code)
+        emitted = True
+        # The closer line's newline belongs to the block, not to the next gap
+        last_end = e + 1 if src.startswith("\n", e) else e
 
     # Raw code segment after last block
-    tail = src[last_end:]
-    if tail.strip():
-        t_sl, t_el = _offsets_to_lines(src, last_end, len(src) - 1 if src else 0)
-        results.append({
-            "pgm_name": input_json.get("pgm_name", ""),
-            "inc_name": input_json.get("inc_name", ""),
+    if NONWS_RE.search(src, last_end):
+        t_sl, t_el = _offsets_to_lines(nl_offsets, last_end, len(src))
+        rec = {
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "raw_code",
-            "name": input_json.get("inc_name", ""),
+            "name": inc_name,
             "start_line": t_sl,
             "end_line": t_el,
-            "code": tail
-        })
+        }
+        if include_code:
+            rec["code"] = src[last_end:]
+        yield rec
+        emitted = True
 
     # Fallback if nothing matched
-    if not results:
-        total_lines = src.count("\n") + (1 if src else 0)
-        results.append({
-            "pgm_name": input_json.get("pgm_name", ""),
-            "inc_name": input_json.get("inc_name", ""),
+    if not emitted:
+        # One entry per line (the -1 sentinel stands for line 1); no rescan of src
+        total_lines = len(nl_offsets) if src else 0
+        rec = {
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "raw_code",
             "start_line": 1 if total_lines else 0,
             "end_line": total_lines,
-            "code": src
-        })
+        }
+        if include_code:
+            rec["code"] = src
+        yield rec
+
+# ---------- Response streaming ----------
+# Records are encoded (orjson) one by one; the full result list is never encoded in
+# one piece. The parse completes before the response starts: once the status line
+# is sent, an error could only truncate a 200 body. Parts are joined into ~64 KiB
+# chunks because Starlette runs a sync iterator one next() per threadpool hop.
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def _ndjson_lines(encoded: Iterable[bytes]) -> Iterator[bytes]:
+    for rec in encoded:
+        yield rec + b"\n"
+
+def _json_array_parts(encoded: Iterable[bytes]) -> Iterator[bytes]:
+    """The same bytes as one JSON array of the records, produced record by record."""
+    yield b"["
+    sep = b""
+    for rec in encoded:
+        yield sep + rec
+        sep = b","
+    yield b"]"
+
+def _chunked(parts: Iterable[bytes], size: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+    buf, buffered = [], 0
+    for part in parts:
+        buf.append(part)
+        buffered += len(part)
+        if buffered >= size:
+            yield b"".join(buf)
+            buf, buffered = [], 0
+    if buf:
+        yield b"".join(buf)
+
+# ---------- Result cache ----------
+# The same include is often reparsed unchanged (linting, CI, IDE plugins). Results are
+# kept per (pgm_name, inc_name, include_code, digest of code) in a small LRU; the code
+# itself is never held as a key. Records are kept encoded (tuple of orjson bytes), which
+# is ~2.5x smaller than the dicts and lets a hit skip serialization entirely.
+# Two limits: PARSE_CACHE_MAXSIZE entries and PARSE_CACHE_MAX_BYTES of encoded records
+# (a few huge includes would otherwise fill memory long before the entry cap). A
+# result larger than the whole byte budget is not cached.
+PARSE_CACHE_MAXSIZE = 512
+PARSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_parse_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_parse_cache_bytes = 0
+_parse_cache_lock = threading.Lock()
+
+def _cache_key(input_json: Dict[str, Any]) -> tuple:
+    code = input_json.get("code", "") or ""
+    digest = hashlib.blake2b(code.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    return (input_json.get("pgm_name", ""), input_json.get("inc_name", ""),
+            bool(input_json.get("include_code", True)), digest)
+
+def _cache_get(key: tuple):
+    with _parse_cache_lock:
+        records = _parse_cache.get(key)
+        if records is not None:
+            _parse_cache.move_to_end(key)
+        return records
+
+def _cache_put(key: tuple, records: tuple) -> None:
+    global _parse_cache_bytes
+    size = sum(map(len, records))
+    if size > PARSE_CACHE_MAX_BYTES:
+        return
+    with _parse_cache_lock:
+        old = _parse_cache.pop(key, None)
+        if old is not None:
+            _parse_cache_bytes -= sum(map(len, old))
+        _parse_cache[key] = records
+        _parse_cache_bytes += size
+        while len(_parse_cache) > PARSE_CACHE_MAXSIZE or _parse_cache_bytes > PARSE_CACHE_MAX_BYTES:
+            _, evicted = _parse_cache.popitem(last=False)
+            _parse_cache_bytes -= sum(map(len, evicted))
+
+def _cache_clear() -> None:
+    global _parse_cache_bytes
+    with _parse_cache_lock:
+        _parse_cache.clear()
+        _parse_cache_bytes = 0
+
+def _encode_records(input_json: Dict[str, Any]) -> tuple:
+    return tuple(map(orjson.dumps, parse_abap_code_to_ndjson(input_json)))
+
+def _encoded_records_cached(input_json: Dict[str, Any]) -> tuple:
+    """The cached result, or a fresh parse (cached once complete)."""
+    key = _cache_key(input_json)
+    encoded = _cache_get(key)
+    if encoded is None:
+        encoded = _encode_records(input_json)
+        _cache_put(key, encoded)
+    return encoded
 
+# ---------- Batch parsing ----------
+# Includes missing from the cache are parsed in a process pool (re holds the GIL).
+# ABAP_PARSER_BATCH_WORKERS caps the pool size; 0 or 1 parses in the request thread.
+# Workers are spawned, not forked: the pool is created on first use from a request
+# thread of the running server, and a fork there would copy its threads' locks.
+BATCH_WORKERS = int(os.environ.get("ABAP_PARSER_BATCH_WORKERS", os.cpu_count() or 1))
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+def _get_batch_pool():
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is None:
+            _batch_pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS,
+                                              mp_context=multiprocessing.get_context("spawn"))
+        return _batch_pool
+
+def _discard_batch_pool(pool) -> None:
+    """Drop a broken pool, unless another request has already replaced it."""
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is pool:
+            _batch_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _pool_map(misses: List[Dict[str, Any]]) -> List[tuple]:
+    pool = _get_batch_pool()
+    chunksize = max(1, len(misses) // (BATCH_WORKERS * 4))
+    try:
+        return list(pool.map(_encode_records, misses, chunksize=chunksize))
+    except BrokenProcessPool:
+        _discard_batch_pool(pool)
+        raise
+
+def _encode_in_pool(misses: List[Dict[str, Any]]) -> List[tuple]:
+    # A worker that dies (OOM kill, crash) breaks the whole executor: every later
+    # submit would fail too. The pool is replaced and the batch retried once.
+    try:
+        return _pool_map(misses)
+    except BrokenProcessPool:
+        return _pool_map(misses)
+
+def _parse_batch(items: List[Dict[str, Any]]) -> List[tuple]:
+    """
+    Encoded records per item, in item order. Cache hits are not sent to the pool,
+    and items with the same cache key are parsed once.
+    """
+    keys = [_cache_key(item) for item in items]
+    results = [_cache_get(key) for key in keys]
+    todo: Dict[tuple, List[int]] = {}   # missing key -> item indices, in first-seen order
+    for i, records in enumerate(results):
+        if records is None:
+            todo.setdefault(keys[i], []).append(i)
+    if not todo:
+        return results
+
+    misses = [items[indices[0]] for indices in todo.values()]
+    if BATCH_WORKERS > 1 and len(misses) > 1:
+        parsed: Iterable[tuple] = _encode_in_pool(misses)
+    else:
+        parsed = map(_encode_records, misses)
+    for (key, indices), records in zip(todo.items(), parsed):
+        _cache_put(key, records)
+        for i in indices:
+            results[i] = records
     return results
 
+# ---------- Startup warm-up ----------
+# Patterns are compiled at import; one parse of a sample that opens and closes every
+# block kind runs each opener/closer, fold_case and orjson once before the first
+# request (nothing is cached).
+_WARMUP_SOURCE = """REPORT zwarmup.
+FORM f_warm USING p TYPE i.
+ENDFORM.
+CLASS lcl_warm DEFINITION.
+ENDCLASS.
+CLASS lcl_warm IMPLEMENTATION.
+  METHOD run.
+  ENDMETHOD.
+ENDCLASS.
+FUNCTION z_warm.
+ENDFUNCTION.
+MODULE status_0100 OUTPUT.
+ENDMODULE.
+DEFINE warm.
+END-OF-DEFINITION.
+METHOD orphan.
+ENDMETHOD.
+"""
+
+def _warmup():
+    warm = {"pgm_name": "", "inc_name": "", "code": _WARMUP_SOURCE}
+    for include_code in (True, False):
+        for rec in parse_abap_code_to_ndjson(warm | {"include_code": include_code}):
+            orjson.dumps(rec)
+
+def _shutdown_batch_pool():
+    global _batch_pool
+    with _batch_pool_lock:
+        if _batch_pool is not None:
+            _batch_pool.shutdown(cancel_futures=True)
+            _batch_pool = None
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    """Warm up before the first request; stop the batch workers on shutdown."""
+    _warmup()
+    yield
+    _shutdown_batch_pool()
+
+app = FastAPI(title="ABAP Parser API", version="1.13", lifespan=_lifespan)
+
 @app.post("/parse_abap")
 def parse_abap(abap_input: ABAPInput):
-    return parse_abap_code_to_ndjson(abap_input.dict())
+    """JSON array of records, streamed in chunks (no full in-memory JSON body)."""
+    # Parsed here, not in the stream: a parse error is a 500, not a cut-off array
+    encoded = _encoded_records_cached(abap_input.dict())
+    return StreamingResponse(
+        _chunked(_json_array_parts(encoded)),
+        media_type="application/json",
+    )
+
+@app.post("/parse_abap_ndjson")
+def parse_abap_ndjson(abap_input: ABAPInput):
+    """Same records as /parse_abap, streamed one JSON object per line."""
+    encoded = _encoded_records_cached(abap_input.dict())
+    return StreamingResponse(
+        _chunked(_ndjson_lines(encoded)),
+        media_type="application/x-ndjson",
+    )
+
+@app.post("/parse_abap_batch")
+def parse_abap_batch(batch: ABAPBatch):
+    """One result list per item, in item order (same records as /parse_abap)."""
+    results = _parse_batch([item.dict() for item in batch.items])
+    body = b",".join(b"[" + b",".join(encoded) + b"]" for encoded in results)
+    return Response(b'{"results":[' + body + b"]}", media_type="application/json")
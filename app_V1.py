@@ -1,7 +1,9 @@
 from fastapi import FastAPI
+from fastapi.responses import Response
 from pydantic import BaseModel
 import re
-import json
+import orjson
+from bisect import bisect_left
 
 app = FastAPI(title="ABAP Parser API", version="1.0")
 
@@ -10,78 +12,61 @@ class ABAPInput(BaseModel):
     inc_name: str
     code: str
 
-def find_line_numbers(block_text, all_lines):
-    """Find start and end line numbers of a code block."""
-    block_lines = block_text.strip().splitlines()
-    first_line = block_lines[0].strip()
-    last_line = block_lines[-1].strip()
-
-    start_line = None
-    end_line = None
-    for idx, line in enumerate(all_lines, start=1):
-        if start_line is None and first_line == line.strip():
-            start_line = idx
-        if last_line == line.strip():
-            end_line = idx
+def find_line_numbers(nl_offsets, match_start, match_end):
+    """Find start and end line numbers of the code span [match_start, match_end)."""
+    start_line = bisect_left(nl_offsets, match_start) + 1
+    end_line = bisect_left(nl_offsets, max(match_end - 1, match_start)) + 1
     return start_line, end_line
 
 # ...imports and FastAPI model stay the same...
 
+# ---------- Block patterns (compiled once at import) ----------
+# Combined regex for FORM, CLASS DEF, CLASS IMPL
+# NOTE: allow optional spaces before the period in starters/enders
+BLOCK_RE = re.compile(
+    r"(FORM\s+\w+\s*\..*?ENDFORM\s*\.)|"
+    r"(CLASS\s+\w+\s+DEFINITION\s*\..*?ENDCLASS\s*\.)|"
+    r"(CLASS\s+\w+\s+IMPLEMENTATION\s*\..*?ENDCLASS\s*\.)",
+    re.IGNORECASE | re.DOTALL
+)
+# Methods inside class impl (also allow spaces before dots); "name" is the method name
+METHOD_BLOCK_RE = re.compile(
+    r"(METHOD\s+(?P<name>\w+)\s*\..*?ENDMETHOD\s*\.)",
+    re.IGNORECASE | re.DOTALL
+)
+
+# Block heads: match() anchors at the start of the stripped block and captures the name
+FORM_HEAD_RE   = re.compile(r"FORM\s+(\w+)\s*\.", re.IGNORECASE)
+CLDEF_HEAD_RE  = re.compile(r"CLASS\s+(\w+)\s+DEFINITION\s*\.", re.IGNORECASE)
+CLIMP_HEAD_RE  = re.compile(r"CLASS\s+(\w+)\s+IMPLEMENTATION\s*\.", re.IGNORECASE)
+NEWLINE_RE     = re.compile("\n")
+
 def parse_abap_code_to_ndjson(input_json: dict):
     abap_code = input_json.get("code", "")
-    lines = abap_code.splitlines()
+    pgm_name = input_json.get("pgm_name", "")
+    inc_name = input_json.get("inc_name", "")
+    nl_offsets = list(map(re.Match.start, NEWLINE_RE.finditer(abap_code)))
     results = []
 
-    # Combined regex for FORM, CLASS DEF, CLASS IMPL
-    # NOTE: allow optional spaces before the period in starters/enders
-    pattern = re.compile(
-        r"(FORM\s+\w+\s*\..*?ENDFORM\s*\.)|"
-        r"(CLASS\s+\w+\s+DEFINITION\s*\..*?ENDCLASS\s*\.)|"
-        r"(CLASS\s+\w+\s+IMPLEMENTATION\s*\..*?ENDCLASS\s*\.)",
-        re.IGNORECASE | re.DOTALL
-    )
-
-    for match in pattern.finditer(abap_code):
+    for match in BLOCK_RE.finditer(abap_code):
         block = match.group(0).strip()
 
-        if re.match(r"^FORM\s+\w+\s*\.", block, re.IGNORECASE):
-            name = re.match(r"FORM\s+(\w+)\s*\.", block, re.IGNORECASE).group(1)
+        if m := FORM_HEAD_RE.match(block):
+            name = m.group(1)
             btype = "perform"
-            extra = {}
 
-        elif re.match(r"^CLASS\s+\w+\s+DEFINITION\s*\.", block, re.IGNORECASE):
-            name = re.match(r"CLASS\s+(\w+)\s+DEFINITION\s*\.", block, re.IGNORECASE).group(1)
+        elif m := CLDEF_HEAD_RE.match(block):
+            name = m.group(1)
             btype = "class_definition"
-            extra = {}
 
-        elif re.match(r"^CLASS\s+\w+\s+IMPLEMENTATION\s*\.", block, re.IGNORECASE):
-            name = re.match(r"CLASS\s+(\w+)\s+IMPLEMENTATION\s*\.", block, re.IGNORECASE).group(1)
+        elif m := CLIMP_HEAD_RE.match(block):
+            name = m.group(1)
             btype = "class_impl"
-            extra = {}
-
-            # Extract methods inside class impl (also allow spaces before dots)
-            method_pattern = re.compile(
-                r"(METHOD\s+\w+\s*\..*?ENDMETHOD\s*\.)",
-                re.IGNORECASE | re.DOTALL
-            )
-            for m_block in method_pattern.findall(block):
-                m_name = re.match(r"METHOD\s+(\w+)\s*\.", m_block, re.IGNORECASE).group(1)
-                m_start, m_end = find_line_numbers(m_block, lines)
-                results.append({
-                    "pgm_name": input_json.get("pgm_name", ""),
-                    "inc_name": input_json.get("inc_name", ""),
-                    "type": "method",
-                    "class_implementation": name,
-                    "name": m_name,
-                    "start_line": m_start,
-                    "end_line": m_end,
-                    "code": m_block.strip()
-                })
 
-        start, end = find_line_numbers(block, lines)
+        start, end = find_line_numbers(nl_offsets, match.start(), match.end())
         results.append({
-            "pgm_name": input_json.get("pgm_name", ""),
-            "inc_name": input_json.get("inc_name", ""),
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": btype,
             "name": name,
             "start_line": start,
@@ -89,17 +74,35 @@ def parse_abap_code_to_ndjson(input_json: dict):
             "code": block
         })
 
+        # Methods follow their class record, so results stay in source order
+        if btype == "class_impl":
+            for m_match in METHOD_BLOCK_RE.finditer(abap_code, match.start(), match.end()):
+                m_block = m_match.group(0)
+                m_name = m_match.group("name")
+                m_start, m_end = find_line_numbers(nl_offsets, m_match.start(), m_match.end())
+                results.append({
+                    "pgm_name": pgm_name,
+                    "inc_name": inc_name,
+                    "type": "method",
+                    "class_implementation": name,
+                    "name": m_name,
+                    "start_line": m_start,
+                    "end_line": m_end,
+                    "code": m_block.strip()
+                })
+
     if not results:
+        # Same count as len(abap_code.splitlines()) for "\n"-separated code
+        total_lines = len(nl_offsets) + (0 if abap_code.endswith("\n") else 1) if abap_code else 0
         results.append({
-            "pgm_name": input_json.get("pgm_name", ""),
-            "inc_name": input_json.get("inc_name", ""),
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "raw_code",
             "start_line": 1,
-            "end_line": len(lines),
+            "end_line": total_lines,
             "code": abap_code.strip()
         })
 
-    results.sort(key=lambda x: x["start_line"])
     return results
 
 
@@ -107,7 +110,7 @@ def parse_abap_code_to_ndjson(input_json: dict):
 @app.post("/parse_abap")
 def parse_abap(abap_input: ABAPInput):
     parsed = parse_abap_code_to_ndjson(abap_input.dict())
-    return parsed
+    return Response(orjson.dumps(parsed), media_type="application/json")
 
 
 # To run:
@@ -1,6 +1,10 @@
 from fastapi import FastAPI
+from fastapi.responses import Response
 from pydantic import BaseModel
 import re
+import orjson
+from bisect import bisect_left
+from typing import Tuple, cast
 
 app = FastAPI(title="ABAP Parser API", version="1.3")
 
@@ -14,46 +18,86 @@ FORM_BLOCK_RE     = re.compile(r"(?ms)^\s*FORM\s+(\w+)\s*\.\s*.*?^\s*ENDFORM\s*\
 CLDEF_BLOCK_RE    = re.compile(r"(?ms)^\s*CLASS\s+(\w+)\s+DEFINITION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
 CLIMP_BLOCK_RE    = re.compile(r"(?ms)^\s*CLASS\s+(\w+)\s+IMPLEMENTATION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
 METHOD_BLOCK_RE   = re.compile(r"(?ms)^\s*METHOD\s+(\w+)\s*\.\s*.*?^\s*ENDMETHOD\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+# METHOD_BLOCK_RE's closer on its own. No method match can end after its last
+# match in a class, so the method finditer stops there: heads past the last
+# ENDMETHOD would otherwise each rescan the rest of the class before failing.
+ENDMETHOD_RE      = re.compile(r"(?ms)^\s*ENDMETHOD\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
 FUNC_BLOCK_RE     = re.compile(r"(?ms)^\s*FUNCTION\s+(\w+)\s*\.\s*.*?^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
 
-# Combined regex for all top-level blocks
-TOPLEVEL_RE = re.compile(
-    r"(?ms)"
-    r"(^\s*FORM\s+\w+\s*\.\s*.*?^\s*ENDFORM\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*CLASS\s+\w+\s+DEFINITION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*CLASS\s+\w+\s+IMPLEMENTATION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*FUNCTION\s+\w+\s*\.\s*.*?^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-)
-
-def _offsets_to_lines(src: str, start: int, end: int):
-    start_line = src.count("\n", 0, start) + 1
-    end_line   = src.count("\n", 0, end) + 1
+# Top-level blocks: the alternatives of one "(FORM...)|(CLASS...)|..." regex, tried in
+# this order at each position. An alternative's match ends where a match of its closer
+# ends, so none ends after the last one: _toplevel_matches runs each alternative only
+# at block heads and only up to there. Otherwise an unterminated head rescans the rest
+# of the source once per alternative before failing, and a few hundred of them take
+# seconds.
+TOPLEVEL_ALT_RES: Tuple["re.Pattern[str]", ...] = tuple(re.compile(r"(?ms)" + alt) for alt in (
+    r"^\s*FORM\s+\w+\s*\.\s*.*?^\s*ENDFORM\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*CLASS\s+\w+\s+DEFINITION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*CLASS\s+\w+\s+IMPLEMENTATION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*FUNCTION\s+\w+\s*\.\s*.*?^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+))
+# Where else an alternative can start: the line after this "\n" (a superset, keyword
+# first on its line). A "\n" prefix is found far faster than a "^" in a scan.
+TOPLEVEL_HEAD_RE = re.compile(r"\n\s*(?:(FORM)|(CLASS)|(FUNCTION))")
+# Head group -> the alternatives that start with its keyword; [0] is the start of the
+# source, where no "\n" comes first and any alternative is tried
+TOPLEVEL_HEAD_ALTS: Tuple[Tuple[int, ...], ...] = ((0, 1, 2, 3), (0,), (1, 2), (3,))
+# Last closer of each alternative: the greedy ".*" backs off from the end of the source
+# to the last match, instead of a forward scan through all of them
+_LAST_ENDFORM_RE     = re.compile(r"(?ms).*^\s*ENDFORM\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+_LAST_ENDCLASS_RE    = re.compile(r"(?ms).*^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+_LAST_ENDFUNCTION_RE = re.compile(r"(?ms).*^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+TOPLEVEL_LAST_CLOSER_RES = (_LAST_ENDFORM_RE, _LAST_ENDCLASS_RE, _LAST_ENDCLASS_RE, _LAST_ENDFUNCTION_RE)
+
+# Alternative k of TOPLEVEL_ALT_RES -> its block pattern at [k]
+TOPLEVEL_BLOCK_RES: Tuple["re.Pattern[str]", ...] = (FORM_BLOCK_RE, CLDEF_BLOCK_RE, CLIMP_BLOCK_RE, FUNC_BLOCK_RE)
+
+# Head of each block pattern, name in group 1: _emit_block reads the name from here
+# instead of re-running the block pattern and its lazy body
+BLOCK_HEAD_RES = {
+    FORM_BLOCK_RE:  re.compile(r"\s*FORM\s+(\w+)\s*\."),
+    CLDEF_BLOCK_RE: re.compile(r"\s*CLASS\s+(\w+)\s+DEFINITION\s*\."),
+    CLIMP_BLOCK_RE: re.compile(r"\s*CLASS\s+(\w+)\s+IMPLEMENTATION\s*\."),
+    FUNC_BLOCK_RE:  re.compile(r"\s*FUNCTION\s+(\w+)\s*\."),
+}
+
+NEWLINE_RE = re.compile("\n")
+# First non-blank character of a span: tests a gap for code without slicing it
+NONWS_RE = re.compile(r"\S")
+
+def _offsets_to_lines(nl_offsets, start: int, end: int):
+    # Newlines before an offset == its 0-based line: one bisect instead of a prefix count
+    start_line = bisect_left(nl_offsets, start) + 1
+    end_line   = bisect_left(nl_offsets, end) + 1
     return start_line, end_line
 
-def _emit_block(input_json, block_text, start_off, end_off, results):
-    start_line, end_line = _offsets_to_lines(input_json["code"], start_off, end_off)
+def _emit_block(pgm_name, inc_name, nl_offsets, block_re, src, start_off, end_off, results):
+    start_line, end_line = _offsets_to_lines(nl_offsets, start_off, end_off)
+    m = BLOCK_HEAD_RES[block_re].match(src, start_off, end_off)
+    if not m:
+        return  # skip unrecognized
 
-    if FORM_BLOCK_RE.match(block_text):
-        name = FORM_BLOCK_RE.match(block_text).group(1)
+    if block_re is FORM_BLOCK_RE:
+        name = m.group(1)
         btype = "perform"
-        extra = {}
-    elif CLDEF_BLOCK_RE.match(block_text):
-        name = CLDEF_BLOCK_RE.match(block_text).group(1)
+    elif block_re is CLDEF_BLOCK_RE:
+        name = m.group(1)
         btype = "class_definition"
-        extra = {}
-    elif CLIMP_BLOCK_RE.match(block_text):
-        name = CLIMP_BLOCK_RE.match(block_text).group(1)
+    elif block_re is CLIMP_BLOCK_RE:
+        name = m.group(1)
         btype = "class_impl"
-        extra = {}
+        methods_end = start_off  # end of the last ENDMETHOD
+        for em in ENDMETHOD_RE.finditer(src, start_off, end_off):
+            methods_end = em.end()
         # Extract methods
-        for mm in METHOD_BLOCK_RE.finditer(block_text):
+        for mm in METHOD_BLOCK_RE.finditer(src, start_off, methods_end):
             m_name = mm.group(1)
-            m_abs_start = start_off + mm.start(0)
-            m_abs_end   = start_off + mm.end(0)
-            m_sl, m_el  = _offsets_to_lines(input_json["code"], m_abs_start, m_abs_end)
+            m_abs_start = mm.start(0)
+            m_abs_end   = mm.end(0)
+            m_sl, m_el  = _offsets_to_lines(nl_offsets, m_abs_start, m_abs_end)
             results.append({
-                "pgm_name": input_json["pgm_name"],
-                "inc_name": input_json["inc_name"],
+                "pgm_name": pgm_name,
+                "inc_name": inc_name,
                 "type": "method",
                 "class_implementation": name,
                 "name": m_name,
@@ -61,70 +105,86 @@ def _emit_block(input_json, block_text, start_off, end_off, results):
                 "end_line": m_el,
                 "code": mm.group(0)
             })
-    elif FUNC_BLOCK_RE.match(block_text):
-        name = FUNC_BLOCK_RE.match(block_text).group(1)
+    elif block_re is FUNC_BLOCK_RE:
+        name = m.group(1)
         btype = "function"
-        extra = {}
     else:
         return  # skip unrecognized
 
     results.append({
-        "pgm_name": input_json["pgm_name"],
-        "inc_name": input_json["inc_name"],
+        "pgm_name": pgm_name,
+        "inc_name": inc_name,
         "type": btype,
         "name": name,
         "start_line": start_line,
         "end_line": end_line,
-        "code": block_text,
-        **extra
+        "code": src[start_off:end_off]
     })
 
+def _toplevel_matches(src: str):
+    """(alternative index, match) of each top-level block, as the combined regex finds them."""
+    last_close = {closer_re: closer_re.match(src) for closer_re in TOPLEVEL_LAST_CLOSER_RES}
+    ends = [cm.end() if (cm := last_close[closer_re]) else 0 for closer_re in TOPLEVEL_LAST_CLOSER_RES]
+    at, pos, alts = 0, 0, TOPLEVEL_HEAD_ALTS[0]
+    while True:
+        for k in alts:
+            if at < ends[k] and (m := TOPLEVEL_ALT_RES[k].match(src, at, ends[k])) is not None:
+                yield k, m
+                pos = m.end() - 1   # a "\n" ending the block can start the next line
+                break
+        head = TOPLEVEL_HEAD_RE.search(src, pos)
+        if head is None:
+            return
+        # Next candidate: the line after the "\n". Every line start of its blank run
+        # fails the same way, so a miss resumes after the keyword.
+        at, pos, alts = head.start() + 1, head.end(), TOPLEVEL_HEAD_ALTS[cast(int, head.lastindex)]
+
 def parse_abap_code_to_ndjson(input_json: dict):
     src = input_json.get("code", "")
+    pgm_name = input_json.get("pgm_name", "")
+    inc_name = input_json.get("inc_name", "")
+    nl_offsets = list(map(re.Match.start, NEWLINE_RE.finditer(src)))
     results = []
 
     last_end = 0
-    for m in TOPLEVEL_RE.finditer(src):
+    for k, m in _toplevel_matches(src):
         s, e = m.start(0), m.end(0)
 
         # Raw code segment before this block
-        gap = src[last_end:s]
-        if gap.strip():
-            g_sl, g_el = _offsets_to_lines(src, last_end, s-1 if s>0 else 0)
+        if NONWS_RE.search(src, last_end, s):
+            g_sl, g_el = _offsets_to_lines(nl_offsets, last_end, s-1 if s>0 else 0)
             results.append({
-                "pgm_name": input_json.get("pgm_name", ""),
-                "inc_name": input_json.get("inc_name", ""),
+                "pgm_name": pgm_name,
+                "inc_name": inc_name,
                 "type": "raw_code",
-                "name": input_json.get("inc_name", ""),
+                "name": inc_name,
                 "start_line": g_sl,
                 "end_line": g_el,
-                "code": gap
+                "code": src[last_end:s]
             })
 
-        block_text = m.group(0)
-        _emit_block(input_json, block_text, s, e, results)
+        _emit_block(pgm_name, inc_name, nl_offsets, TOPLEVEL_BLOCK_RES[k], src, s, e, results)
         last_end = e
 
     # Raw code segment after last block
-    tail = src[last_end:]
-    if tail.strip():
-        t_sl, t_el = _offsets_to_lines(src, last_end, len(src)-1 if src else 0)
+    if NONWS_RE.search(src, last_end):
+        t_sl, t_el = _offsets_to_lines(nl_offsets, last_end, len(src)-1 if src else 0)
         results.append({
-            "pgm_name": input_json.get("pgm_name", ""),
-            "inc_name": input_json.get("inc_name", ""),
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "raw_code",
-            "name": input_json.get("inc_name", ""),
+            "name": inc_name,
             "start_line": t_sl,
             "end_line": t_el,
-            "code": tail
+            "code": src[last_end:]
         })
 
     # Fallback if nothing matched
     if not results:
-        total_lines = src.count("\n") + (1 if src else 0)
+        total_lines = len(nl_offsets) + (1 if src else 0)  # newline index, no rescan of src
         results.append({
-            "pgm_name": input_json.get("pgm_name", ""),
-            "inc_name": input_json.get("inc_name", ""),
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "raw_code",
             "start_line": 1 if total_lines else 0,
             "end_line": total_lines,
@@ -135,4 +195,5 @@ def parse_abap_code_to_ndjson(input_json: dict):
 
 @app.post("/parse_abap")
 def parse_abap(abap_input: ABAPInput):
-    return parse_abap_code_to_ndjson(abap_input.dict())
+    parsed = parse_abap_code_to_ndjson(abap_input.dict())
+    return Response(orjson.dumps(parsed), media_type="application/json")
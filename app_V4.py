@@ -1,6 +1,10 @@
 from fastapi import FastAPI
+from fastapi.responses import Response
 from pydantic import BaseModel
 import re
+import orjson
+from bisect import bisect_left
+from typing import Tuple, cast
 
 app = FastAPI(title="ABAP Parser API", version="1.5")
 
@@ -14,81 +18,113 @@ FORM_BLOCK_RE     = re.compile(r"(?ms)^\s*FORM\s+(\w+)\s*\.\s*.*?^\s*ENDFORM\s*\
 CLDEF_BLOCK_RE    = re.compile(r"(?ms)^\s*CLASS\s+(\w+)\s+DEFINITION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
 CLIMP_BLOCK_RE    = re.compile(r"(?ms)^\s*CLASS\s+(\w+)\s+IMPLEMENTATION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
 METHOD_BLOCK_RE   = re.compile(r"(?ms)^\s*METHOD\s+(\w+)\s*\.\s*.*?^\s*ENDMETHOD\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+# METHOD_BLOCK_RE's closer alone: bounds the method scan (see app_V2.py)
+ENDMETHOD_RE      = re.compile(r"(?ms)^\s*ENDMETHOD\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
 FUNC_BLOCK_RE     = re.compile(r"(?ms)^\s*FUNCTION\s+(\w+)\s*\.\s*.*?^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
 MODULE_BLOCK_RE   = re.compile(r"(?ms)^\s*MODULE\s+(\w+)\s*\.\s*.*?^\s*ENDMODULE\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
 
-# Combined regex for all top-level blocks
-TOPLEVEL_RE = re.compile(
-    r"(?ms)"
-    r"(^\s*FORM\s+\w+\s*\.\s*.*?^\s*ENDFORM\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*CLASS\s+\w+\s+DEFINITION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*CLASS\s+\w+\s+IMPLEMENTATION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*FUNCTION\s+\w+\s*\.\s*.*?^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*MODULE\s+\w+\s*\.\s*.*?^\s*ENDMODULE\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-)
-
-def _offsets_to_lines(src: str, start: int, end: int):
-    start_line = src.count("\n", 0, start) + 1
-    end_line   = src.count("\n", 0, end) + 1
+# Top-level blocks, one alternative per kind in the order the combined regex tried them;
+# each runs only at block heads and up to its closer's last match (see app_V2.py)
+TOPLEVEL_ALT_RES: Tuple["re.Pattern[str]", ...] = tuple(re.compile(r"(?ms)" + alt) for alt in (
+    r"^\s*FORM\s+\w+\s*\.\s*.*?^\s*ENDFORM\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*CLASS\s+\w+\s+DEFINITION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*CLASS\s+\w+\s+IMPLEMENTATION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*FUNCTION\s+\w+\s*\.\s*.*?^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*MODULE\s+\w+\s*\.\s*.*?^\s*ENDMODULE\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+))
+TOPLEVEL_HEAD_RE = re.compile(r"\n\s*(?:(FORM)|(CLASS)|(FUNCTION)|(MODULE))")
+TOPLEVEL_HEAD_ALTS: Tuple[Tuple[int, ...], ...] = ((0, 1, 2, 3, 4), (0,), (1, 2), (3,), (4,))
+_LAST_ENDFORM_RE     = re.compile(r"(?ms).*^\s*ENDFORM\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+_LAST_ENDCLASS_RE    = re.compile(r"(?ms).*^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+_LAST_ENDFUNCTION_RE = re.compile(r"(?ms).*^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+_LAST_ENDMODULE_RE   = re.compile(r"(?ms).*^\s*ENDMODULE\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+TOPLEVEL_LAST_CLOSER_RES = (_LAST_ENDFORM_RE, _LAST_ENDCLASS_RE, _LAST_ENDCLASS_RE, _LAST_ENDFUNCTION_RE, _LAST_ENDMODULE_RE)
+
+# Alternative k of TOPLEVEL_ALT_RES -> its block pattern at [k]
+TOPLEVEL_BLOCK_RES: Tuple["re.Pattern[str]", ...] = (FORM_BLOCK_RE, CLDEF_BLOCK_RE, CLIMP_BLOCK_RE, FUNC_BLOCK_RE, MODULE_BLOCK_RE)
+
+# Heads only, name in group 1 (MODULE mode is not reported in v1.5)
+BLOCK_HEAD_RES = {
+    FORM_BLOCK_RE:   re.compile(r"\s*FORM\s+(\w+)\s*\."),
+    CLDEF_BLOCK_RE:  re.compile(r"\s*CLASS\s+(\w+)\s+DEFINITION\s*\."),
+    CLIMP_BLOCK_RE:  re.compile(r"\s*CLASS\s+(\w+)\s+IMPLEMENTATION\s*\."),
+    FUNC_BLOCK_RE:   re.compile(r"\s*FUNCTION\s+(\w+)\s*\."),
+    MODULE_BLOCK_RE: re.compile(r"\s*MODULE\s+(\w+)\s*\."),
+}
+
+NEWLINE_RE = re.compile("\n")
+# Gap test without slicing (see app_V2.py)
+NONWS_RE = re.compile(r"\S")
+
+def _offsets_to_lines(nl_offsets, start: int, end: int):
+    # 0-based line of an offset by bisect (see app_V2.py)
+    start_line = bisect_left(nl_offsets, start) + 1
+    end_line   = bisect_left(nl_offsets, end) + 1
     return start_line, end_line
 
-def _emit_block(input_json, block_text, start_off, end_off, results):
+def _emit_block(pgm_name, inc_name, nl_offsets, block_re, src, start_off, end_off, results):
     """
     Emits one or more result records for a matched block.
     For class_impl: emit container-only code first, then full method items.
     For others: emit single record as-is.
     """
-    start_line, end_line = _offsets_to_lines(input_json["code"], start_off, end_off)
+    start_line, end_line = _offsets_to_lines(nl_offsets, start_off, end_off)
+    m = BLOCK_HEAD_RES[block_re].match(src, start_off, end_off)
+    if not m:
+        return  # skip unrecognized
 
     # FORM
-    if FORM_BLOCK_RE.match(block_text):
-        name = FORM_BLOCK_RE.match(block_text).group(1)
+    if block_re is FORM_BLOCK_RE:
+        name = m.group(1)
         results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "perform",
             "name": name,
             "start_line": start_line,
             "end_line": end_line,
-            "code": block_text
+            "code": src[start_off:end_off]
         })
         return
 
     # CLASS DEFINITION
-    if CLDEF_BLOCK_RE.match(block_text):
-        name = CLDEF_BLOCK_RE.match(block_text).group(1)
+    if block_re is CLDEF_BLOCK_RE:
+        name = m.group(1)
         results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "class_definition",
             "name": name,
             "start_line": start_line,
             "end_line": end_line,
-            "code": block_text
+            "code": src[start_off:end_off]
         })
         return
 
     # CLASS IMPLEMENTATION (container-only + methods-after)
-    if CLIMP_BLOCK_RE.match(block_text):
-        name = CLIMP_BLOCK_RE.match(block_text).group(1)
+    if block_re is CLIMP_BLOCK_RE:
+        name = m.group(1)
 
-        # Find method spans inside the class block
-        method_spans = [(mm.start(0), mm.end(0)) for mm in METHOD_BLOCK_RE.finditer(block_text)]
+        # Find methods inside the class block (matches reused for emission)
+        methods_end = start_off  # end of the last ENDMETHOD
+        for em in ENDMETHOD_RE.finditer(src, start_off, end_off):
+            methods_end = em.end()
+        methods = list(METHOD_BLOCK_RE.finditer(src, start_off, methods_end))
 
-        if method_spans:
-            first_start = method_spans[0][0]
-            last_end    = method_spans[-1][1]
-            header = block_text[:first_start].rstrip()
-            footer = block_text[last_end:].lstrip()
+        if methods:
+            first_start = methods[0].start(0)
+            last_end    = methods[-1].end(0)
+            header = src[start_off:first_start].rstrip()
+            footer = src[last_end:end_off].lstrip()
             container_code = header + "\n" + footer
         else:
             # No methods inside: container is the whole block
-            container_code = block_text
+            container_code = src[start_off:end_off]
 
         # Emit the class_impl FIRST with container-only code
         results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "class_impl",
             "name": name,
             "start_line": start_line,
@@ -97,14 +133,14 @@ def _emit_block(input_json, block_text, start_off, end_off, results):
         })
 
         # Then emit each method (full body)
-        for mm in METHOD_BLOCK_RE.finditer(block_text):
+        for mm in methods:
             m_name = mm.group(1)
-            m_abs_start = start_off + mm.start(0)
-            m_abs_end   = start_off + mm.end(0)
-            m_sl, m_el  = _offsets_to_lines(input_json["code"], m_abs_start, m_abs_end)
+            m_abs_start = mm.start(0)
+            m_abs_end   = mm.end(0)
+            m_sl, m_el  = _offsets_to_lines(nl_offsets, m_abs_start, m_abs_end)
             results.append({
-                "pgm_name": input_json["pgm_name"],
-                "inc_name": input_json["inc_name"],
+                "pgm_name": pgm_name,
+                "inc_name": inc_name,
                 "type": "method",
                 "class_implementation": name,
                 "name": m_name,
@@ -115,82 +151,98 @@ def _emit_block(input_json, block_text, start_off, end_off, results):
         return
 
     # FUNCTION
-    if FUNC_BLOCK_RE.match(block_text):
-        name = FUNC_BLOCK_RE.match(block_text).group(1)
+    if block_re is FUNC_BLOCK_RE:
+        name = m.group(1)
         results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "function",
             "name": name,
             "start_line": start_line,
             "end_line": end_line,
-            "code": block_text
+            "code": src[start_off:end_off]
         })
         return
 
     # MODULE
-    if MODULE_BLOCK_RE.match(block_text):
-        name = MODULE_BLOCK_RE.match(block_text).group(1)
+    if block_re is MODULE_BLOCK_RE:
+        name = m.group(1)
         results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "module",
             "name": name,
             "start_line": start_line,
             "end_line": end_line,
-            "code": block_text
+            "code": src[start_off:end_off]
         })
         return
 
     # Unrecognized → nothing
     return
 
+def _toplevel_matches(src: str):
+    """(alternative index, match) of each top-level block, as the combined regex finds them (see app_V2.py)."""
+    last_close = {closer_re: closer_re.match(src) for closer_re in TOPLEVEL_LAST_CLOSER_RES}
+    ends = [cm.end() if (cm := last_close[closer_re]) else 0 for closer_re in TOPLEVEL_LAST_CLOSER_RES]
+    at, pos, alts = 0, 0, TOPLEVEL_HEAD_ALTS[0]
+    while True:
+        for k in alts:
+            if at < ends[k] and (m := TOPLEVEL_ALT_RES[k].match(src, at, ends[k])) is not None:
+                yield k, m
+                pos = m.end() - 1
+                break
+        head = TOPLEVEL_HEAD_RE.search(src, pos)
+        if head is None:
+            return
+        at, pos, alts = head.start() + 1, head.end(), TOPLEVEL_HEAD_ALTS[cast(int, head.lastindex)]
+
 def parse_abap_code_to_ndjson(input_json: dict):
     src = input_json.get("code", "")
+    pgm_name = input_json.get("pgm_name", "")
+    inc_name = input_json.get("inc_name", "")
+    nl_offsets = list(map(re.Match.start, NEWLINE_RE.finditer(src)))
     results = []
 
     last_end = 0
-    for m in TOPLEVEL_RE.finditer(src):
+    for k, m in _toplevel_matches(src):
         s, e = m.start(0), m.end(0)
 
         # Raw code segment before this block
-        gap = src[last_end:s]
-        if gap.strip():
-            g_sl, g_el = _offsets_to_lines(src, last_end, s - 1 if s > 0 else 0)
+        if NONWS_RE.search(src, last_end, s):
+            g_sl, g_el = _offsets_to_lines(nl_offsets, last_end, s - 1 if s > 0 else 0)
             results.append({
-                "pgm_name": input_json.get("pgm_name", ""),
-                "inc_name": input_json.get("inc_name", ""),
+                "pgm_name": pgm_name,
+                "inc_name": inc_name,
                 "type": "raw_code",
-                "name": input_json.get("inc_name", ""),
+                "name": inc_name,
                 "start_line": g_sl,
                 "end_line": g_el,
-                "code": gap
+                "code": src[last_end:s]
             })
 
-        block_text = m.group(0)
-        _emit_block(input_json, block_text, s, e, results)
+        _emit_block(pgm_name, inc_name, nl_offsets, TOPLEVEL_BLOCK_RES[k], src, s, e, results)
         last_end = e
 
     # Raw code segment after last block
-    tail = src[last_end:]
-    if tail.strip():
-        t_sl, t_el = _offsets_to_lines(src, last_end, len(src) - 1 if src else 0)
+    if NONWS_RE.search(src, last_end):
+        t_sl, t_el = _offsets_to_lines(nl_offsets, last_end, len(src) - 1 if src else 0)
         results.append({
-            "pgm_name": input_json.get("pgm_name", ""),
-            "inc_name": input_json.get("inc_name", ""),
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "raw_code",
-            "name": input_json.get("inc_name", ""),
+            "name": inc_name,
             "start_line": t_sl,
             "end_line": t_el,
-            "code": tail
+            "code": src[last_end:]
         })
 
     # Fallback if nothing matched
     if not results:
-        total_lines = src.count("\n") + (1 if src else 0)
+        total_lines = len(nl_offsets) + (1 if src else 0)  # see app_V2.py
         results.append({
-            "pgm_name": input_json.get("pgm_name", ""),
-            "inc_name": input_json.get("inc_name", ""),
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "raw_code",
             "start_line": 1 if total_lines else 0,
             "end_line": total_lines,
@@ -201,4 +253,5 @@ def parse_abap_code_to_ndjson(input_json: dict):
 
 @app.post("/parse_abap")
 def parse_abap(abap_input: ABAPInput):
-    return parse_abap_code_to_ndjson(abap_input.dict())
+    parsed = parse_abap_code_to_ndjson(abap_input.dict())
+    return Response(orjson.dumps(parsed), media_type="application/json")
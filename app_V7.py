@@ -1,8 +1,11 @@
 # abap_parser_app.py
 from fastapi import FastAPI
+from fastapi.responses import Response
 from pydantic import BaseModel
 import re
-from typing import List, Dict, Any
+import orjson
+from bisect import bisect_left
+from typing import List, Dict, Any, Tuple, cast
 
 app = FastAPI(title="ABAP Parser API", version="1.10")
 
@@ -33,6 +36,8 @@ CLIMP_BLOCK_RE  = re.compile(
 METHOD_BLOCK_RE = re.compile(
     r"(?ims)^\s*METHOD\s+([A-Za-z_]\w*(?:~\w+)?|constructor|class_constructor)\s*\.\s*.*?^\s*ENDMETHOD\s*\.(?:[ \t]*\"[^\n]*)?"
 )
+# METHOD_BLOCK_RE's closer alone: bounds the method scan (see app_V2.py)
+ENDMETHOD_RE    = re.compile(r"(?ims)^\s*ENDMETHOD\s*\.(?:[ \t]*\"[^\n]*)?")
 FUNC_BLOCK_RE   = re.compile(
     r"(?ims)^\s*FUNCTION\s+(\w+)\s*\.\s*.*?^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$"
 )
@@ -43,82 +48,113 @@ MACRO_BLOCK_RE  = re.compile(
     r"(?ims)^\s*DEFINE\s+(\w+)\s*\.\s*.*?^\s*END-OF-DEFINITION\s*\.(?:[ \t]*\"[^\n]*)?\s*$"
 )
 
-# Combined regex for all top-level blocks.
+# Top-level blocks, one alternative per kind in the order the combined regex tried them;
+# each runs only at block heads and up to its closer's last match (see app_V2.py)
 # IMPORTANT: the class implementation alt will swallow the whole class block, so
 # methods inside won’t be double-matched by the METHOD alt below.
-TOPLEVEL_RE = re.compile(
-    r"(?ims)"
-    r"(^\s*FORM\s+\w+\b[\s\S]*?\.\s*.*?^\s*ENDFORM\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*CLASS\s+\w+\s+DEFINITION\b[^\n]*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*CLASS\s+\w+\s+IMPLEMENTATION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*FUNCTION\s+\w+\s*\.\s*.*?^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*MODULE\s+\w+(?:\s+(?:INPUT|OUTPUT))?\s*\.\s*.*?^\s*ENDMODULE\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*DEFINE\s+\w+\s*\.\s*.*?^\s*END-OF-DEFINITION\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-    r"|(^\s*METHOD\s+(?:[A-Za-z_]\w*(?:~\w+)?|constructor|class_constructor)\s*\.\s*.*?^\s*ENDMETHOD\s*\.(?:[ \t]*\"[^\n]*)?\s*$)"
-)
+TOPLEVEL_ALT_RES: Tuple["re.Pattern[str]", ...] = tuple(re.compile(r"(?ims)" + alt) for alt in (
+    r"^\s*FORM\s+\w+\b[\s\S]*?\.\s*.*?^\s*ENDFORM\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*CLASS\s+\w+\s+DEFINITION\b[^\n]*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*CLASS\s+\w+\s+IMPLEMENTATION\s*\.\s*.*?^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*FUNCTION\s+\w+\s*\.\s*.*?^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*MODULE\s+\w+(?:\s+(?:INPUT|OUTPUT))?\s*\.\s*.*?^\s*ENDMODULE\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*DEFINE\s+\w+\s*\.\s*.*?^\s*END-OF-DEFINITION\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+    r"^\s*METHOD\s+(?:[A-Za-z_]\w*(?:~\w+)?|constructor|class_constructor)\s*\.\s*.*?^\s*ENDMETHOD\s*\.(?:[ \t]*\"[^\n]*)?\s*$",
+))
+TOPLEVEL_HEAD_RE = re.compile(r"(?i)\n\s*(?:(FORM)|(CLASS)|(FUNCTION)|(MODULE)|(DEFINE)|(METHOD))")
+TOPLEVEL_HEAD_ALTS: Tuple[Tuple[int, ...], ...] = ((0, 1, 2, 3, 4, 5, 6), (0,), (1, 2), (3,), (4,), (5,), (6,))
+_LAST_ENDFORM_RE           = re.compile(r"(?ims).*(^\s*ENDFORM\s*\.(?:[ \t]*\"[^\n]*)?\s*$)")
+_LAST_ENDCLASS_RE          = re.compile(r"(?ims).*^\s*ENDCLASS\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+_LAST_ENDFUNCTION_RE       = re.compile(r"(?ims).*^\s*ENDFUNCTION\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+_LAST_ENDMODULE_RE         = re.compile(r"(?ims).*^\s*ENDMODULE\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+_LAST_END_OF_DEFINITION_RE = re.compile(r"(?ims).*^\s*END-OF-DEFINITION\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+_LAST_ENDMETHOD_RE         = re.compile(r"(?ims).*^\s*ENDMETHOD\s*\.(?:[ \t]*\"[^\n]*)?\s*$")
+TOPLEVEL_LAST_CLOSER_RES = (_LAST_ENDFORM_RE, _LAST_ENDCLASS_RE, _LAST_ENDCLASS_RE, _LAST_ENDFUNCTION_RE, _LAST_ENDMODULE_RE, _LAST_END_OF_DEFINITION_RE, _LAST_ENDMETHOD_RE)
+
+# Alternative k of TOPLEVEL_ALT_RES -> its block pattern at [k]
+TOPLEVEL_BLOCK_RES: Tuple["re.Pattern[str]", ...] = (FORM_BLOCK_RE, CLDEF_BLOCK_RE, CLIMP_BLOCK_RE, FUNC_BLOCK_RE, MODULE_BLOCK_RE, MACRO_BLOCK_RE, METHOD_BLOCK_RE)
+
+# Block heads: name in group 1, MODULE mode in group 2; METHOD accepts the same
+# names as METHOD_BLOCK_RE (iface~method, constructors)
+BLOCK_HEAD_RES = {
+    FORM_BLOCK_RE:   re.compile(r"(?i)\s*FORM\s+(\w+)\b"),
+    CLDEF_BLOCK_RE:  re.compile(r"(?i)\s*CLASS\s+(\w+)\s+DEFINITION\b"),
+    CLIMP_BLOCK_RE:  re.compile(r"(?i)\s*CLASS\s+(\w+)\s+IMPLEMENTATION\s*\."),
+    FUNC_BLOCK_RE:   re.compile(r"(?i)\s*FUNCTION\s+(\w+)\s*\."),
+    MODULE_BLOCK_RE: re.compile(r"(?i)\s*MODULE\s+(\w+)(?:\s+(INPUT|OUTPUT))?\s*\."),
+    MACRO_BLOCK_RE:  re.compile(r"(?i)\s*DEFINE\s+(\w+)\s*\."),
+    METHOD_BLOCK_RE: re.compile(r"(?i)\s*METHOD\s+([A-Za-z_]\w*(?:~\w+)?|constructor|class_constructor)\s*\."),
+}
 
-def _offsets_to_lines(src: str, start: int, end: int):
+NEWLINE_RE = re.compile("\n")
+# Gap test without slicing (see app_V2.py)
+NONWS_RE = re.compile(r"\S")
+
+def _offsets_to_lines(nl_offsets: List[int], start: int, end: int):
     """Convert absolute character offsets into 1-based line numbers (inclusive)."""
-    start_line = src.count("\n", 0, start) + 1 if src else 0
-    end_line   = src.count("\n", 0, end) + 1 if src else 0
+    # 0-based line of an offset by bisect (see app_V2.py)
+    start_line = bisect_left(nl_offsets, start) + 1
+    end_line   = bisect_left(nl_offsets, end) + 1
     return start_line, end_line
 
-def _emit_block(input_json: Dict[str, Any], block_text: str, start_off: int, end_off: int, results: List[Dict[str, Any]]):
+def _emit_block(pgm_name: str, inc_name: str, nl_offsets: List[int], block_re: "re.Pattern", src: str, start_off: int, end_off: int, results: List[Dict[str, Any]]):
     """
     Emits one or more result records for a matched block.
     For class_impl: emit container-only code first, then full method items.
     For others: emit single record as-is.
     """
-    src_all = input_json["code"]
-    start_line, end_line = _offsets_to_lines(src_all, start_off, end_off)
+    start_line, end_line = _offsets_to_lines(nl_offsets, start_off, end_off)
+    m = BLOCK_HEAD_RES[block_re].match(src, start_off, end_off)
+    if not m:
+        return  # skip unrecognized
 
     # FORM
-    m = FORM_BLOCK_RE.match(block_text)
-    if m:
+    if block_re is FORM_BLOCK_RE:
         name = m.group(1)
         results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "perform",
             "name": name,
             "start_line": start_line,
             "end_line": end_line,
-            "code": block_text
+            "code": src[start_off:end_off]
         })
         return
 
     # CLASS DEFINITION
-    m = CLDEF_BLOCK_RE.match(block_text)
-    if m:
+    if block_re is CLDEF_BLOCK_RE:
         name = m.group(1)
         results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "class_definition",
             "name": name,
             "start_line": start_line,
             "end_line": end_line,
-            "code": block_text
+            "code": src[start_off:end_off]
         })
         return
 
     # CLASS IMPLEMENTATION (container + inner methods)
-    m = CLIMP_BLOCK_RE.match(block_text)
-    if m:
+    if block_re is CLIMP_BLOCK_RE:
         class_name = m.group(1)
-        method_spans = [(mm.start(0), mm.end(0)) for mm in METHOD_BLOCK_RE.finditer(block_text)]
-        if method_spans:
-            first_start = method_spans[0][0]
-            last_end    = method_spans[-1][1]
-            header = block_text[:first_start].rstrip()
-            footer = block_text[last_end:].lstrip()
+        methods_end = start_off  # end of the last ENDMETHOD
+        for em in ENDMETHOD_RE.finditer(src, start_off, end_off):
+            methods_end = em.end()
+        methods = list(METHOD_BLOCK_RE.finditer(src, start_off, methods_end))
+        if methods:
+            first_start = methods[0].start(0)
+            last_end    = methods[-1].end(0)
+            header = src[start_off:first_start].rstrip()
+            footer = src[last_end:end_off].lstrip()
             container_code = header + ("\n" if header and footer else "") + footer
         else:
-            container_code = block_text
+            container_code = src[start_off:end_off]
 
         results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "class_impl",
             "name": class_name,
             "start_line": start_line,
@@ -126,14 +162,14 @@ def _emit_block(input_json: Dict[str, Any], block_text: str, start_off: int, end
             "code": container_code
         })
 
-        for mm in METHOD_BLOCK_RE.finditer(block_text):
+        for mm in methods:
             m_name = mm.group(1)
-            m_abs_start = start_off + mm.start(0)
-            m_abs_end   = start_off + mm.end(0)
-            m_sl, m_el  = _offsets_to_lines(src_all, m_abs_start, m_abs_end)
+            m_abs_start = mm.start(0)
+            m_abs_end   = mm.end(0)
+            m_sl, m_el  = _offsets_to_lines(nl_offsets, m_abs_start, m_abs_end)
             results.append({
-                "pgm_name": input_json["pgm_name"],
-                "inc_name": input_json["inc_name"],
+                "pgm_name": pgm_name,
+                "inc_name": inc_name,
                 "type": "method",
                 "class_implementation": class_name,
                 "name": m_name,
@@ -144,33 +180,31 @@ def _emit_block(input_json: Dict[str, Any], block_text: str, start_off: int, end
         return
 
     # FUNCTION
-    m = FUNC_BLOCK_RE.match(block_text)
-    if m:
+    if block_re is FUNC_BLOCK_RE:
         name = m.group(1)
         results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "function",
             "name": name,
             "start_line": start_line,
             "end_line": end_line,
-            "code": block_text
+            "code": src[start_off:end_off]
         })
         return
 
     # MODULE
-    m = MODULE_BLOCK_RE.match(block_text)
-    if m:
+    if block_re is MODULE_BLOCK_RE:
         name = m.group(1)
         mode = (m.group(2) or "").upper()
         rec = {
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "module",
             "name": name,
             "start_line": start_line,
             "end_line": end_line,
-            "code": block_text
+            "code": src[start_off:end_off]
         }
         if mode:
             rec["mode"] = mode
@@ -178,32 +212,30 @@ def _emit_block(input_json: Dict[str, Any], block_text: str, start_off: int, end
         return
 
     # MACRO
-    m = MACRO_BLOCK_RE.match(block_text)
-    if m:
+    if block_re is MACRO_BLOCK_RE:
         name = m.group(1)
         results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "macro",
             "name": name,
             "start_line": start_line,
             "end_line": end_line,
-            "code": block_text
+            "code": src[start_off:end_off]
         })
         return
 
     # Stand-alone METHOD (when not wrapped by a class implementation in this include)
-    m = METHOD_BLOCK_RE.match(block_text)
-    if m:
+    if block_re is METHOD_BLOCK_RE:
         m_name = m.group(1)
         results.append({
-            "pgm_name": input_json["pgm_name"],
-            "inc_name": input_json["inc_name"],
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "method",
             "name": m_name,
             "start_line": start_line,
             "end_line": end_line,
-            "code": block_text
+            "code": src[start_off:end_off]
         })
         return
 
@@ -219,52 +251,75 @@ def _normalize_code(s: str) -> str:
     s = s.replace("\u2028", "\n").replace("\u2029", "\n")
     return s
 
+def _toplevel_matches(src: str):
+    """(alternative index, match) of each top-level block, as the combined regex finds them (see app_V2.py)."""
+    last_close = {closer_re: closer_re.match(src) for closer_re in TOPLEVEL_LAST_CLOSER_RES}
+    ends = [cm.end() if (cm := last_close[closer_re]) else 0 for closer_re in TOPLEVEL_LAST_CLOSER_RES]
+    # The FORM header runs to the first dot anywhere after the name, which has to come
+    # before the last ENDFORM line: heads past the dot before it cannot match, and
+    # would each scan their header out to that line before failing
+    form_close = last_close[_LAST_ENDFORM_RE]
+    form_last_dot = src.rfind(".", 0, form_close.start(1)) if form_close else -1
+    at, pos, alts = 0, 0, TOPLEVEL_HEAD_ALTS[0]
+    while True:
+        for k in alts:
+            if k == 0 and at > form_last_dot:
+                continue
+            if at < ends[k] and (m := TOPLEVEL_ALT_RES[k].match(src, at, ends[k])) is not None:
+                yield k, m
+                pos = m.end() - 1
+                break
+        head = TOPLEVEL_HEAD_RE.search(src, pos)
+        if head is None:
+            return
+        at, pos, alts = head.start() + 1, head.end(), TOPLEVEL_HEAD_ALTS[cast(int, head.lastindex)]
+
 def parse_abap_code_to_ndjson(input_json: dict):
     src = _normalize_code(input_json.get("code", "") or "")
+    pgm_name = input_json.get("pgm_name", "")
+    inc_name = input_json.get("inc_name", "")
+    nl_offsets = list(map(re.Match.start, NEWLINE_RE.finditer(src)))
     results: List[Dict[str, Any]] = []
 
     last_end = 0
-    for m in TOPLEVEL_RE.finditer(src):
+    for k, m in _toplevel_matches(src):
         s, e = m.start(0), m.end(0)
 
         # Raw code segment before this block
-        gap = src[last_end:s]
-        if gap.strip():
-            g_sl, g_el = _offsets_to_lines(src, last_end, s - 1 if s > 0 else 0)
+        if NONWS_RE.search(src, last_end, s):
+            g_sl, g_el = _offsets_to_lines(nl_offsets, last_end, s - 1 if s > 0 else 0)
             results.append({
-                "pgm_name": input_json.get("pgm_name", ""),
-                "inc_name": input_json.get("inc_name", ""),
+                "pgm_name": pgm_name,
+                "inc_name": inc_name,
                 "type": "raw_code",
-                "name": input_json.get("inc_name", ""),
+                "name": inc_name,
                 "start_line": g_sl,
                 "end_line": g_el,
-                "code": gap
+                "code": src[last_end:s]
             })
 
-        block_text = m.group(0)
-        _emit_block(input_json | {"code": src}, block_text, s, e, results)
+        _emit_block(pgm_name, inc_name, nl_offsets, TOPLEVEL_BLOCK_RES[k], src, s, e, results)
         last_end = e
 
     # Raw code segment after last block
-    tail = src[last_end:]
-    if tail.strip():
-        t_sl, t_el = _offsets_to_lines(src, last_end, len(src) - 1 if src else 0)
+    if NONWS_RE.search(src, last_end):
+        t_sl, t_el = _offsets_to_lines(nl_offsets, last_end, len(src) - 1 if src else 0)
         results.append({
-            "pgm_name": input_json.get("pgm_name", ""),
-            "inc_name": input_json.get("inc_name", ""),
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "raw_code",
-            "name": input_json.get("inc_name", ""),
+            "name": inc_name,
             "start_line": t_sl,
             "end_line": t_el,
-            "code": tail
+            "code": src[last_end:]
         })
 
     # Fallback if nothing matched
     if not results:
-        total_lines = src.count("\n") + (1 if src else 0)
+        total_lines = len(nl_offsets) + (1 if src else 0)  # see app_V2.py
         results.append({
-            "pgm_name": input_json.get("pgm_name", ""),
-            "inc_name": input_json.get("inc_name", ""),
+            "pgm_name": pgm_name,
+            "inc_name": inc_name,
             "type": "raw_code",
             "start_line": 1 if total_lines else 0,
             "end_line": total_lines,
@@ -275,4 +330,5 @@ def parse_abap_code_to_ndjson(input_json: dict):
 
 @app.post("/parse_abap")
 def parse_abap(abap_input: ABAPInput):
-    return parse_abap_code_to_ndjson(abap_input.dict())
+    parsed = parse_abap_code_to_ndjson(abap_input.dict())
+    return Response(orjson.dumps(parsed), media_type="application/json")
@@ -0,0 +1,140 @@
+# bench_parser.py  (parse timings behind the performance commits; run from the repo root)
+#
+#   python bench/bench_parser.py                 # app.py on the sample corpus
+#   python bench/bench_parser.py app_V7          # a snapshot instead
+#   python bench/bench_parser.py app statements  # 20k-line report, few blocks
+#   python bench/bench_parser.py app malformed   # unterminated blocks (linear-time check)
+#   python bench/bench_parser.py app newlines    # ways to build the newline offset index
+import argparse
+import importlib
+import os
+import random
+import re
+import sys
+import time
+from itertools import accumulate, repeat
+from operator import add
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+CORPUS_DIR = os.path.join(HERE, "corpus")
+
+
+def load_corpus() -> str:
+    parts = []
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        with open(os.path.join(CORPUS_DIR, name), encoding="utf-8") as f:
+            parts.append(f.read())
+    return "\n".join(parts)
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def parse_once(mod, code: str):
+    return list(mod.parse_abap_code_to_ndjson({"pgm_name": "ZBENCH", "inc_name": "ZBENCH", "code": code}))
+
+
+def bench_corpus(mod, modname: str) -> None:
+    base = load_corpus()
+    for reps in (20, 400):
+        code = base * reps
+        records = parse_once(mod, code)
+        t = best_of(lambda: parse_once(mod, code))
+        print(f"{modname} corpus x{reps}: lines={code.count(chr(10))} records={len(records)} {t * 1000:.1f} ms")
+
+
+def statement_report(n_lines: int = 20000) -> str:
+    """Statement-heavy report: mostly plain lines, a FORM every 500 lines (fixed seed)."""
+    rnd = random.Random(0)
+    stmts = ["  DATA lv_%d TYPE i.", "  MOVE a TO b.", "  CALL FUNCTION 'X'.", "  CLEAR lv_x.",
+             "  WRITE / 'text'.", "* comment line", "  IF a = b.", "  ENDIF.",
+             "  FIELD-SYMBOLS <fs> TYPE any.", "  SELECT * FROM mara INTO TABLE lt."]
+    lines = []
+    for i in range(n_lines):
+        lines.append(rnd.choice(stmts).replace("%d", str(i)))
+        if i % 500 == 0:
+            lines += [f"FORM f{i}.", "  WRITE 1.", "ENDFORM."]
+    return "\n".join(lines)
+
+
+def bench_statements(mod, modname: str) -> None:
+    code = statement_report()
+    records = parse_once(mod, code)
+    t = best_of(lambda: parse_once(mod, code), repeat=20)
+    print(f"{modname} statements: lines={code.count(chr(10))} records={len(records)} {t * 1000:.1f} ms")
+
+
+# Malformed includes: openers without their closer, which the old ".*?" block
+# regexes rescanned to the end of the source once per opener
+MALFORMED = {
+    "unterminated FORMs": lambda n: "\n".join(f"FORM f{i}." for i in range(n)),
+    "mixed unterminated openers": lambda n: "\n".join(
+        ["FORM a.", "CLASS c DEFINITION.", "CLASS c IMPLEMENTATION.", "FUNCTION f.",
+         "MODULE m.", "DEFINE d.", "METHOD m."][i % 7] for i in range(n)),
+    "unterminated METHODs in a class": lambda n: (
+        "CLASS c IMPLEMENTATION.\n" + "\n".join("  METHOD m." for _ in range(n)) + "\nENDCLASS."),
+    "long line without a dot": lambda n: "CLASS c DEFINITION " + "x " * (n * 10),
+    "FORM headers without a dot": lambda n: "\n".join(f"FORM f{i}" for i in range(n)) + "\nENDFORM.",
+}
+
+
+def bench_malformed(mod, modname: str, sizes) -> None:
+    for name, make in MALFORMED.items():
+        row = []
+        for n in sizes:
+            code = make(n)
+            row.append(f"{n}: {best_of(lambda: parse_once(mod, code), repeat=1) * 1000:.1f} ms")
+        print(f"{modname} {name}: " + ", ".join(row))
+
+
+# Newline offset index (app._newline_offsets): re.finditer in C against a split/
+# accumulate that never leaves C either. Equal results are asserted first.
+NEWLINE_RE = re.compile("\n")
+
+
+def newlines_finditer(src: str):
+    return list(map(re.Match.start, NEWLINE_RE.finditer(src)))
+
+
+def newlines_accumulate(src: str):
+    # newline k is at sum(len(line) + 1 for the lines up to k) - 1
+    return list(accumulate(map(add, map(len, src.split("\n")[:-1]), repeat(1)), initial=-1))[1:]
+
+
+def bench_newlines(reps: int = 190) -> None:
+    code = load_corpus() * reps
+    assert newlines_finditer(code) == newlines_accumulate(code)
+    for fn in (newlines_finditer, newlines_accumulate):
+        t = best_of(lambda: fn(code), repeat=20)
+        print(f"{fn.__name__}: lines={code.count(chr(10))} {t * 1000:.2f} ms")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Parse timings for app.py and its snapshots")
+    ap.add_argument("module", nargs="?", default="app", help="app (default) or a snapshot, e.g. app_V7")
+    ap.add_argument("case", nargs="?", default="corpus", choices=("corpus", "statements", "malformed", "newlines"))
+    ap.add_argument("--sizes", default="2000,4000,8000", help="line counts for 'malformed'")
+    args = ap.parse_args()
+
+    if args.case == "newlines":
+        bench_newlines()
+        return
+    mod = importlib.import_module(args.module)
+    if args.case == "corpus":
+        bench_corpus(mod, args.module)
+    elif args.case == "statements":
+        bench_statements(mod, args.module)
+    else:
+        bench_malformed(mod, args.module, [int(n) for n in args.sizes.split(",")])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# Endpoint behaviour of app.py (response framing, cache and batch handling).
+from concurrent.futures.process import BrokenProcessPool
+
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+
+client = TestClient(app.app)
+
+
+def item(inc_name: str, code: str):
+    return {"pgm_name": "ZPROG", "inc_name": inc_name, "code": code}
+
+
+def expected(payload):
+    return list(app.parse_abap_code_to_ndjson(payload))
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    app._cache_clear()
+    yield
+    app._cache_clear()
+
+
+BATCH = [
+    item("ZINC_A", "FORM f_a.\nENDFORM.\n"),
+    item("ZINC_B", "WRITE 'b'.\n"),
+    item("ZINC_C", "CLASS lcl_c IMPLEMENTATION.\n  METHOD m.\n  ENDMETHOD.\nENDCLASS.\n"),
+    item("ZINC_A", "FORM f_a.\nENDFORM.\n"),
+    item("ZINC_D", "MODULE status_0100 OUTPUT.\nENDMODULE.\n"),
+]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_results_follow_item_order(monkeypatch, workers):
+    monkeypatch.setattr(app, "BATCH_WORKERS", workers)
+    try:
+        response = client.post("/parse_abap_batch", json={"items": BATCH})
+    finally:
+        app._shutdown_batch_pool()
+    assert response.status_code == 200
+    assert orjson.loads(response.content) == {"results": [expected(p) for p in BATCH]}
+
+
+class FakePool:
+    """Stands in for ProcessPoolExecutor; a broken one fails like a pool with a dead worker."""
+    created = []
+
+    def __init__(self, broken):
+        self.broken, self.shut_down = broken, False
+        FakePool.created.append(self)
+
+    def map(self, fn, items, chunksize=1):
+        if self.broken:
+            raise BrokenProcessPool("a worker died")
+        return map(fn, items)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+@pytest.fixture
+def fake_pools(monkeypatch):
+    """Pools handed out by app._get_batch_pool: True for broken, False for working."""
+    def install(*broken):
+        states = iter(broken)
+        FakePool.created = []
+        monkeypatch.setattr(app, "BATCH_WORKERS", 2)
+        monkeypatch.setattr(app, "ProcessPoolExecutor", lambda **kwargs: FakePool(next(states)))
+        return FakePool.created
+    yield install
+    app._batch_pool = None
+
+
+def test_broken_pool_is_replaced_and_the_batch_retried(fake_pools):
+    pools = fake_pools(True, False)
+    response = client.post("/parse_abap_batch", json={"items": BATCH})
+    assert response.status_code == 200
+    assert orjson.loads(response.content) == {"results": [expected(p) for p in BATCH]}
+    assert [pool.shut_down for pool in pools] == [True, False]
+    assert app._batch_pool is pools[1]
+
+
+def test_pool_broken_twice_is_an_error_and_not_kept(fake_pools):
+    pools = fake_pools(True, True, False)
+    failing = TestClient(app.app, raise_server_exceptions=False)
+    assert failing.post("/parse_abap_batch", json={"items": BATCH}).status_code == 500
+    assert app._batch_pool is None and all(pool.shut_down for pool in pools)
+
+    # The next batch gets a fresh pool
+    assert client.post("/parse_abap_batch", json={"items": BATCH}).status_code == 200
+    assert app._batch_pool is pools[2]
+
+
+def test_lifespan_stops_the_batch_pool(monkeypatch):
+    monkeypatch.setattr(app, "BATCH_WORKERS", 2)
+    with TestClient(app.app) as live:
+        assert live.post("/parse_abap_batch", json={"items": BATCH}).status_code == 200
+        assert app._batch_pool is not None
+    assert app._batch_pool is None
+    # The warm-up parse caches nothing
+    assert len(app._parse_cache) == 4
+
+
+def test_batch_parses_duplicate_items_once(monkeypatch):
+    monkeypatch.setattr(app, "BATCH_WORKERS", 1)
+    parsed = []
+    encode = app._encode_records
+    monkeypatch.setattr(app, "_encode_records", lambda p: parsed.append(p["inc_name"]) or encode(p))
+
+    response = client.post("/parse_abap_batch", json={"items": BATCH})
+    assert response.status_code == 200
+    assert parsed == ["ZINC_A", "ZINC_B", "ZINC_C", "ZINC_D"]
+
+    # A second batch is served from the cache
+    client.post("/parse_abap_batch", json={"items": BATCH})
+    assert len(parsed) == 4
+
+
+def test_cache_evicts_on_the_byte_budget(monkeypatch):
+    small, large = item("ZINC_S", "WRITE 1.\n"), item("ZINC_L", "WRITE 2.\n" * 200)
+    size = {k: sum(map(len, app._encode_records(p))) for k, p in (("small", small), ("large", large))}
+    monkeypatch.setattr(app, "PARSE_CACHE_MAX_BYTES", size["small"] + size["large"])
+
+    client.post("/parse_abap", json=small)
+    client.post("/parse_abap", json=large)
+    assert len(app._parse_cache) == 2
+    assert app._parse_cache_bytes == size["small"] + size["large"]
+
+    # One more small include goes over the budget: the least recently used one is dropped
+    client.post("/parse_abap", json=item("ZINC_T", "WRITE 1.\n"))
+    assert [key[1] for key in app._parse_cache] == ["ZINC_L", "ZINC_T"]
+    assert app._parse_cache_bytes == sum(sum(map(len, r)) for r in app._parse_cache.values())
+
+
+def test_result_larger_than_the_byte_budget_is_not_cached(monkeypatch):
+    monkeypatch.setattr(app, "PARSE_CACHE_MAX_BYTES", 10)
+    response = client.post("/parse_abap", json=item("ZINC_A", "FORM f_a.\nENDFORM.\n"))
+    assert response.status_code == 200
+    assert not app._parse_cache and app._parse_cache_bytes == 0
+
+
+def test_parse_abap_returns_json_array():
+    payload = item("ZINC_A", "REPORT z.\nFORM f_a.\nENDFORM.\n")
+    response = client.post("/parse_abap", json=payload)
+    assert response.status_code == 200
+    assert orjson.loads(response.content) == expected(payload)
+
+
+def test_parse_abap_ndjson_returns_one_record_per_line():
+    payload = item("ZINC_A", "REPORT z.\nFORM f_a.\nENDFORM.\n")
+    response = client.post("/parse_abap_ndjson", json=payload)
+    assert response.status_code == 200
+    assert [orjson.loads(line) for line in response.content.splitlines()] == expected(payload)
+
+
+@pytest.mark.parametrize("path", ["/parse_abap", "/parse_abap_ndjson"])
+def test_parse_error_is_a_500_not_a_truncated_body(monkeypatch, path):
+    parse = app.parse_abap_code_to_ndjson
+
+    def failing_parse(input_json):
+        yield from parse(input_json)
+        raise RuntimeError("parser failed after the first records")
+
+    monkeypatch.setattr(app, "parse_abap_code_to_ndjson", failing_parse)
+    response = TestClient(app.app, raise_server_exceptions=False).post(
+        path, json=item("ZINC_A", "FORM f_a.\nENDFORM.\n"))
+    assert response.status_code == 500
+    assert not app._parse_cache
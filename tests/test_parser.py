@@ -0,0 +1,231 @@
+# Pins the line-scanner (v1.13) records of app.parse_abap_code_to_ndjson on representative includes.
+import pytest
+
+import app
+from abap_patterns import fold_case
+
+PGM, INC = "ZPROG", "ZPROG_F01"
+
+
+def parse(code: str, **options):
+    return list(app.parse_abap_code_to_ndjson({"pgm_name": PGM, "inc_name": INC, "code": code, **options}))
+
+
+def raw(start_line: int, end_line: int, code: str):
+    return {"pgm_name": PGM, "inc_name": INC, "type": "raw_code", "name": INC,
+            "start_line": start_line, "end_line": end_line, "code": code}
+
+
+def block(btype: str, name: str, start_line: int, end_line: int, code: str, **extra):
+    return {"pgm_name": PGM, "inc_name": INC, "type": btype, "name": name,
+            "start_line": start_line, "end_line": end_line, "code": code, **extra}
+
+
+def test_form_with_multiline_header():
+    code = (
+        "REPORT zdemo.\n"
+        "FORM f_calc USING p_a TYPE i\n"
+        "                  p_b TYPE i.\n"
+        "  WRITE p_a.\n"
+        "ENDFORM.\n"
+        "WRITE 'done'.\n"
+    )
+    assert parse(code) == [
+        raw(1, 1, "REPORT zdemo.\n"),
+        block("perform", "f_calc", 2, 5,
+              "FORM f_calc USING p_a TYPE i\n                  p_b TYPE i.\n  WRITE p_a.\nENDFORM."),
+        raw(6, 6, "WRITE 'done'.\n"),
+    ]
+
+
+def test_form_name_with_hyphens():
+    assert parse("FORM process-data-material.\nENDFORM.\n") == [
+        block("perform", "process-data-material", 1, 2, "FORM process-data-material.\nENDFORM."),
+    ]
+
+
+def test_class_impl_with_methods():
+    code = (
+        "CLASS lcl_a IMPLEMENTATION.\n"
+        "  METHOD constructor.\n"
+        "  ENDMETHOD.\n"
+        "  METHOD run.\n"
+        "    WRITE 'x'.\n"
+        "  ENDMETHOD. \" done\n"
+        "  METHOD lif_x~do.\n"
+        "  ENDMETHOD. WRITE 'after'.\n"
+        "ENDCLASS.\n"
+    )
+    assert parse(code) == [
+        block("class_impl", "lcl_a", 1, 9, "CLASS lcl_a IMPLEMENTATION.\nWRITE 'after'.\nENDCLASS."),
+        block("method", "constructor", 2, 3, "  METHOD constructor.\n  ENDMETHOD.",
+              class_implementation="lcl_a"),
+        block("method", "run", 4, 6, "  METHOD run.\n    WRITE 'x'.\n  ENDMETHOD. \" done",
+              class_implementation="lcl_a"),
+        # ENDMETHOD followed by code: the code stays in the container
+        block("method", "lif_x~do", 7, 8, "  METHOD lif_x~do.\n  ENDMETHOD.",
+              class_implementation="lcl_a"),
+    ]
+
+
+def test_class_definition_and_standalone_method():
+    code = (
+        "CLASS lcl_b DEFINITION FINAL CREATE PRIVATE.\n"
+        "ENDCLASS.\n"
+        "METHOD orphan.\n"
+        "ENDMETHOD.\n"
+    )
+    assert parse(code) == [
+        block("class_definition", "lcl_b", 1, 2, "CLASS lcl_b DEFINITION FINAL CREATE PRIVATE.\nENDCLASS."),
+        block("method", "orphan", 3, 4, "METHOD orphan.\nENDMETHOD."),
+    ]
+
+
+def test_module_input_output():
+    code = (
+        "MODULE status_0100 OUTPUT.\n"
+        "  SET PF-STATUS 'MAIN'.\n"
+        "ENDMODULE.\n"
+        "MODULE user_command_0100 INPUT.\n"
+        "ENDMODULE.\n"
+        "MODULE plain.\n"
+        "ENDMODULE.\n"
+    )
+    assert parse(code) == [
+        block("module", "status_0100", 1, 3, "MODULE status_0100 OUTPUT.\n  SET PF-STATUS 'MAIN'.\nENDMODULE.",
+              mode="OUTPUT"),
+        block("module", "user_command_0100", 4, 5, "MODULE user_command_0100 INPUT.\nENDMODULE.",
+              mode="INPUT"),
+        block("module", "plain", 6, 7, "MODULE plain.\nENDMODULE."),
+    ]
+
+
+def test_function():
+    assert parse("FUNCTION z_calc.\n  WRITE 1.\nENDFUNCTION.\n") == [
+        block("function", "z_calc", 1, 3, "FUNCTION z_calc.\n  WRITE 1.\nENDFUNCTION."),
+    ]
+
+
+def test_macro():
+    code = (
+        "DEFINE add_one.\n"
+        "  &1 = &1 + 1.\n"
+        "END-OF-DEFINITION.\n"
+        "add_one lv_x.\n"
+    )
+    assert parse(code) == [
+        block("macro", "add_one", 1, 3, "DEFINE add_one.\n  &1 = &1 + 1.\nEND-OF-DEFINITION."),
+        raw(4, 4, "add_one lv_x.\n"),
+    ]
+
+
+def test_unterminated_block_runs_to_next_closer():
+    # The first FORM has no ENDFORM: it closes at the next one, like the lazy regex did
+    code = "FORM f_open.\n  WRITE 'no end'.\nFORM f_ok.\nENDFORM.\n"
+    assert parse(code) == [
+        block("perform", "f_open", 1, 4, code[:-1]),
+    ]
+
+
+def test_unterminated_block_without_closer_is_raw_code():
+    code = "WRITE 1.\nFORM f_open.\n  WRITE 2.\nCLASS lcl_c DEFINITION.\nENDCLASS.\n"
+    assert parse(code) == [
+        raw(1, 3, "WRITE 1.\nFORM f_open.\n  WRITE 2.\n"),
+        block("class_definition", "lcl_c", 4, 5, "CLASS lcl_c DEFINITION.\nENDCLASS."),
+    ]
+
+
+@pytest.mark.parametrize("comment", [
+    "* Größe (latin-1 only)",       # one byte per character
+    "* Größe prüfen – ß",           # "ß" expands when uppercased
+    "* ﬁle",                        # so does the "ﬁ" ligature
+])
+def test_non_ascii_comments_keep_offsets(comment):
+    code = f"{comment}\nform f_size.\n  \" Maß: ß\nEndForm.\nWRITE 'ok'.\n"
+    assert parse(code) == [
+        raw(1, 1, comment + "\n"),
+        block("perform", "f_size", 2, 4, "form f_size.\n  \" Maß: ß\nEndForm."),
+        raw(5, 5, "WRITE 'ok'.\n"),
+    ]
+
+
+@pytest.mark.parametrize("src", ["abc", "Größe", "straße – ß", "ﬁle ß"])
+def test_fold_case_keeps_length(src):
+    up = fold_case(src)
+    assert len(up) == len(src)
+    # ASCII letters (all the keywords need) are always folded
+    assert up.encode("ascii", "ignore") == src.encode("ascii", "ignore").upper()
+
+
+def test_crlf_is_normalized():
+    assert parse("FORM f_a.\r\nENDFORM.\r\n") == [
+        block("perform", "f_a", 1, 2, "FORM f_a.\nENDFORM."),
+    ]
+
+
+def test_no_blocks_is_one_raw_record():
+    assert parse("WRITE 'hello'.\nWRITE 'world'.\n") == [
+        raw(1, 2, "WRITE 'hello'.\nWRITE 'world'.\n"),
+    ]
+
+
+def test_empty_source():
+    assert parse("") == [
+        {"pgm_name": PGM, "inc_name": INC, "type": "raw_code", "start_line": 0, "end_line": 0, "code": ""},
+    ]
+
+
+def test_include_code_false_drops_code():
+    records = parse("REPORT z.\nFORM f_a.\nENDFORM.\n", include_code=False)
+    assert [r["type"] for r in records] == ["raw_code", "perform"]
+    assert all("code" not in r for r in records)
+
+
+# ---------- Block boundaries of the line scanner ----------
+# Before the line scanner, the block regexes ("^\s*FORM ... ENDFORM\s*\.\s*$") also
+# took the blank lines before an opener and the whitespace after a closer.
+
+def test_blank_lines_before_block_stay_in_the_gap():
+    # Before: raw(1, 1, "WRITE 1.\n"), perform 2-6 "\n\nFORM f_a.\nENDFORM.\n", raw(6, 7, ...)
+    code = "WRITE 1.\n\n\nFORM f_a.\nENDFORM.\n\nWRITE 2.\n"
+    assert parse(code) == [
+        raw(1, 3, "WRITE 1.\n\n\n"),
+        block("perform", "f_a", 4, 5, "FORM f_a.\nENDFORM."),
+        raw(6, 7, "\nWRITE 2.\n"),
+    ]
+
+
+def test_closer_line_newline_belongs_to_the_block():
+    # Before: perform 2-5 "...ENDFORM.", then raw(5, 6, "\nWRITE 'done'.\n") sharing line 5
+    code = "REPORT z.\nFORM f_a.\n  WRITE 1.\n  WRITE 2.\nENDFORM.\nWRITE 'done'.\n"
+    assert parse(code)[1:] == [
+        block("perform", "f_a", 2, 5, "FORM f_a.\n  WRITE 1.\n  WRITE 2.\nENDFORM."),
+        raw(6, 6, "WRITE 'done'.\n"),
+    ]
+
+
+def test_last_block_ends_on_its_closer_line():
+    # Before: f_b ran to line 5 with code "FORM f_b.\nENDFORM.\n" (trailing newline taken)
+    assert parse("FORM f_a.\nENDFORM.\nFORM f_b.\nENDFORM.\n") == [
+        block("perform", "f_a", 1, 2, "FORM f_a.\nENDFORM."),
+        block("perform", "f_b", 3, 4, "FORM f_b.\nENDFORM."),
+    ]
+
+
+def test_methods_start_on_their_method_line():
+    # Before: one method "a" on lines 2-6, from the blank line through b's ENDMETHOD
+    # ("\s*" after the dot of an empty METHOD skipped its ENDMETHOD line start)
+    code = (
+        "CLASS lcl_a IMPLEMENTATION.\n"
+        "\n"
+        "  METHOD a.\n"
+        "  ENDMETHOD.\n"
+        "  METHOD b.\n"
+        "  ENDMETHOD.\n"
+        "ENDCLASS.\n"
+    )
+    assert parse(code) == [
+        block("class_impl", "lcl_a", 1, 7, "CLASS lcl_a IMPLEMENTATION.\nENDCLASS."),
+        block("method", "a", 3, 4, "  METHOD a.\n  ENDMETHOD.", class_implementation="lcl_a"),
+        block("method", "b", 5, 6, "  METHOD b.\n  ENDMETHOD.", class_implementation="lcl_a"),
+    ]
@@ -0,0 +1,131 @@
+# Output of the frozen v1.3-v1.10 snapshots (app_V2..app_V7) on class implementations
+# and malformed includes.
+# Performance changes to a snapshot must leave these records as they are.
+import importlib
+
+import pytest
+
+V2_TO_V3 = ["app_V2", "app_V3"]
+V4_TO_V5 = ["app_V4", "app_V5"]
+V6_TO_V7 = ["app_V6", "app_V7"]
+
+
+def parse(modname: str, code: str):
+    mod = importlib.import_module(modname)
+    records = mod.parse_abap_code_to_ndjson({"pgm_name": "ZPROG", "inc_name": "ZINC", "code": code})
+    return [(r["type"], r["name"], r["start_line"], r["end_line"], r["code"]) for r in records]
+
+
+EMPTY_METHOD = (
+    "CLASS lcl_a IMPLEMENTATION.\n"
+    "  METHOD constructor.\n"
+    "  ENDMETHOD.\n"
+    "  METHOD run.\n"
+    "    WRITE 'x'.\n"
+    "  ENDMETHOD.\n"
+    "ENDCLASS.\n"
+)
+# "\s*" after the empty method's dot skips the start of its ENDMETHOD line, so it
+# runs on to the next ENDMETHOD
+EMPTY_METHOD_RECORD = ("method", "constructor", 2, 6, EMPTY_METHOD[28:-11])
+
+
+@pytest.mark.parametrize("modname", V2_TO_V3)
+def test_empty_method_v1_3(modname):
+    assert parse(modname, EMPTY_METHOD) == [
+        EMPTY_METHOD_RECORD,
+        ("class_impl", "lcl_a", 1, 8, EMPTY_METHOD),
+    ]
+
+
+@pytest.mark.parametrize("modname", V4_TO_V5 + V6_TO_V7)
+def test_empty_method_v1_5(modname):
+    assert parse(modname, EMPTY_METHOD) == [
+        ("class_impl", "lcl_a", 1, 8, "CLASS lcl_a IMPLEMENTATION.\nENDCLASS.\n"),
+        EMPTY_METHOD_RECORD,
+    ]
+
+
+IFACE_METHOD = (
+    "CLASS lcl_a IMPLEMENTATION.\n"
+    "  METHOD run.\n"
+    "    WRITE 'x'.\n"
+    "  ENDMETHOD.\n"
+    "  METHOD lif_x~do.\n"
+    "    WRITE 'y'.\n"
+    "  ENDMETHOD.\n"
+    "ENDCLASS.\n"
+)
+RUN_RECORD = ("method", "run", 2, 4, "  METHOD run.\n    WRITE 'x'.\n  ENDMETHOD.")
+
+
+@pytest.mark.parametrize("modname", V4_TO_V5)
+def test_iface_method_is_container_code_before_v1_9(modname):
+    assert parse(modname, IFACE_METHOD) == [
+        ("class_impl", "lcl_a", 1, 9,
+         "CLASS lcl_a IMPLEMENTATION.\nMETHOD lif_x~do.\n    WRITE 'y'.\n  ENDMETHOD.\nENDCLASS.\n"),
+        RUN_RECORD,
+    ]
+
+
+@pytest.mark.parametrize("modname", V6_TO_V7)
+def test_iface_method_v1_9(modname):
+    assert parse(modname, IFACE_METHOD) == [
+        ("class_impl", "lcl_a", 1, 9, "CLASS lcl_a IMPLEMENTATION.\nENDCLASS.\n"),
+        RUN_RECORD,
+        ("method", "lif_x~do", 5, 7, "  METHOD lif_x~do.\n    WRITE 'y'.\n  ENDMETHOD."),
+    ]
+
+
+SAME_LINE_METHOD = (
+    "CLASS lcl_a IMPLEMENTATION.\n"
+    "  METHOD a.\n"
+    "    WRITE 1.\n"
+    "  ENDMETHOD. METHOD b.\n"
+    "    WRITE 2.\n"
+    "  ENDMETHOD.\n"
+    "ENDCLASS.\n"
+)
+
+
+@pytest.mark.parametrize("modname", V4_TO_V5)
+def test_method_after_endmethod_on_one_line_v1_5(modname):
+    # The ENDMETHOD closer must end its line: "a" runs on to the second ENDMETHOD
+    assert parse(modname, SAME_LINE_METHOD) == [
+        ("class_impl", "lcl_a", 1, 8, "CLASS lcl_a IMPLEMENTATION.\nENDCLASS.\n"),
+        ("method", "a", 2, 6, SAME_LINE_METHOD[28:-11]),
+    ]
+
+
+@pytest.mark.parametrize("modname", V6_TO_V7)
+def test_method_after_endmethod_on_one_line_v1_9(modname):
+    # "a" ends at its ENDMETHOD; "METHOD b." does not start a line and stays in the container
+    assert parse(modname, SAME_LINE_METHOD) == [
+        ("class_impl", "lcl_a", 1, 8, "CLASS lcl_a IMPLEMENTATION.\nMETHOD b.\n    WRITE 2.\n  ENDMETHOD.\nENDCLASS.\n"),
+        ("method", "a", 2, 4, "  METHOD a.\n    WRITE 1.\n  ENDMETHOD."),
+    ]
+
+
+@pytest.mark.parametrize("modname", V2_TO_V3 + V4_TO_V5 + V6_TO_V7)
+def test_methods_after_the_last_endmethod_are_not_methods(modname):
+    code = "CLASS lcl_a IMPLEMENTATION.\n  METHOD a.\n  ENDMETHOD.\n" + "  METHOD m.\n" * 2000 + "ENDCLASS.\n"
+    methods = [r for r in parse(modname, code) if r[0] == "method"]
+    assert methods == [("method", "a", 2, 3, "  METHOD a.\n  ENDMETHOD.")]
+
+
+@pytest.mark.parametrize("modname", V2_TO_V3 + V4_TO_V5 + V6_TO_V7)
+def test_unterminated_forms_do_not_hide_later_blocks(modname):
+    # Each unterminated head used to rescan the rest of the source: thousands took minutes
+    forms = "".join(f"FORM f{i}.\n" for i in range(3000))
+    code = forms + "CLASS lcl_a DEFINITION.\nENDCLASS.\n" + "FORM g.\n"
+    assert parse(modname, code) == [
+        ("raw_code", "ZINC", 1, 3000, forms),
+        ("class_definition", "lcl_a", 3001, 3002, "CLASS lcl_a DEFINITION.\nENDCLASS."),
+        ("raw_code", "ZINC", 3002, 3003, "\nFORM g.\n"),
+    ]
+
+
+def test_form_heads_without_a_dot_v1_10():
+    # v1.10 FORM headers run to the first dot on any line; none comes before ENDFORM
+    code = "".join(f"FORM f{i}\n" for i in range(3000)) + "ENDFORM.\n"
+    assert parse("app_V7", code) == [("raw_code", "ZINC", 1, 3001, code)]